@@ -0,0 +1,217 @@
+"""
+Near-Duplicate Detection - Next Generation
+MinHash signatures with LSH banding, to find knowledge base entries that say the same thing
+"""
+import random
+import zlib
+from typing import Dict, Hashable, List, Optional
+
+import numpy
+
+from memory.search_index import normalize_text
+
+# Shingles are character n-grams of the normalized, whitespace-collapsed text
+SHINGLE_SIZE = 4
+# Universal hash family h(x) = (a * x + b) mod p over 32-bit shingle hashes; a, b < 2**31 keeps
+# a * x + b inside 64 bits, so it never overflows uint64
+_PRIME = 4294967291
+_MAX_COEFFICIENT = 1 << 31
+
+
+def shingles(text: str) -> set:
+    """Distinct character shingles of text"""
+    text = " ".join(normalize_text(text).split())
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+class MinHasher:
+    """Fixed family of hash permutations turning shingle sets into MinHash signatures"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        """
+        Initialize the hash family
+        Args:
+            num_perm: Signature length
+            seed: Seed of the permutation coefficients (signatures are only comparable with the same seed)
+        """
+        generator = random.Random(seed)
+        self.num_perm = num_perm
+        self.coefficients = [(generator.randrange(1, _MAX_COEFFICIENT), generator.randrange(0, _MAX_COEFFICIENT))
+                             for _ in range(num_perm)]
+        self._a = numpy.array([a for a, _ in self.coefficients], dtype=numpy.uint64)[:, None]
+        self._b = numpy.array([b for _, b in self.coefficients], dtype=numpy.uint64)[:, None]
+
+    def signature(self, text: str) -> tuple:
+        """
+        MinHash signature of text
+        Args:
+            text: Raw text
+        Returns:
+            Tuple of num_perm minimum hash values
+        """
+        hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)]
+        values = (self._a * numpy.array(hashes, dtype=numpy.uint64) + self._b) % numpy.uint64(_PRIME)
+        return tuple(values.min(axis=1).tolist())
+
+
+def estimated_jaccard(first: tuple, second: tuple) -> float:
+    """Share of equal signature positions, an estimate of the shingle sets' Jaccard similarity"""
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+class DuplicateIndex:
+    """
+    LSH over MinHash signatures: a signature is cut into bands, and entries sharing any band
+    bucket become candidates that are then checked against the similarity threshold.
+    Entries may carry a group key; only entries of the same group are ever candidates, so
+    entries added lazily are only hashed once an entry of their group is looked up.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 8):
+        """
+        Initialize an empty index
+        Args:
+            threshold: Estimated Jaccard similarity from which two entries are duplicates
+            num_perm: Signature length
+            bands: LSH bands (num_perm / bands rows each); 8 x 8 puts the LSH cut-off near 0.77
+        """
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.signatures = {}
+        self.groups = {}
+        # group -> band key -> entry ids
+        self.buckets = {}
+        # group -> [(entry id, text)] not hashed yet
+        self.pending = {}
+        # Groups with entries added since the last clusters() call
+        self.dirty = set()
+
+    def _band_keys(self, signature: tuple) -> List[tuple]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def _insert(self, key: int, signature: tuple, group: Hashable):
+        self.signatures[key] = signature
+        buckets = self.buckets.setdefault(group, {})
+        for band_key in self._band_keys(signature):
+            buckets.setdefault(band_key, []).append(key)
+
+    def _hash_pending(self, group: Hashable):
+        """Hash the lazily added entries of a group"""
+        for key, text in self.pending.pop(group, ()):
+            self._insert(key, self.hasher.signature(text), group)
+
+    def add(self, key: int, text: str = None, signature: tuple = None, group: Hashable = None,
+            lazy: bool = False) -> Optional[tuple]:
+        """
+        Index an entry
+        Args:
+            key: Entry id
+            text: Entry text (ignored when signature is given)
+            signature: Precomputed signature
+            group: Entries of different groups are never duplicates
+            lazy: Defer hashing until the group is looked up, and treat the entry as already
+                checked by clusters() (for entries loaded from disk)
+        Returns:
+            The entry's signature (None while deferred)
+        """
+        self.groups[key] = group
+        if lazy and signature is None:
+            self.pending.setdefault(group, []).append((key, text))
+            return None
+        signature = signature or self.hasher.signature(text)
+        self._insert(key, signature, group)
+        if not lazy:
+            self.dirty.add(group)
+        return signature
+
+    def find(self, text: str = None, signature: tuple = None, group: Hashable = None) -> Optional[int]:
+        """
+        Most similar indexed entry of the same group at or above the threshold
+        Args:
+            text: Text to look up (ignored when signature is given)
+            signature: Precomputed signature
+            group: Group of the text
+        Returns:
+            Entry id, or None if nothing is similar enough
+        """
+        self._hash_pending(group)
+        buckets = self.buckets.get(group)
+        if not buckets:
+            return None
+        signature = signature or self.hasher.signature(text)
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(buckets.get(band_key, ()))
+        best, best_score = None, self.threshold
+        for key in sorted(candidates):
+            score = estimated_jaccard(signature, self.signatures[key])
+            if score >= best_score and (best is None or score > best_score):
+                best, best_score = key, score
+        return best
+
+    def clusters(self) -> List[List[int]]:
+        """
+        Groups of mutually near-duplicate entries (connected through the threshold) among the groups
+        that gained entries since the last call, sorted by id
+        Returns:
+            Clusters with more than one entry
+        """
+        dirty, self.dirty = self.dirty, set()
+        parent = {}
+
+        def root(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for group in dirty:
+            self._hash_pending(group)
+            for keys in self.buckets.get(group, {}).values():
+                for key in keys:
+                    parent.setdefault(key, key)
+                # Compare each entry with one representative per cluster already seen in the bucket,
+                # so a bucket full of copies of the same insight stays linear
+                representatives = []
+                for key in keys:
+                    for representative in representatives:
+                        a, b = root(representative), root(key)
+                        if a == b:
+                            break
+                        if estimated_jaccard(self.signatures[representative], self.signatures[key]) >= self.threshold:
+                            parent[max(a, b)] = min(a, b)
+                            break
+                    else:
+                        representatives.append(key)
+
+        clusters: Dict[int, List[int]] = {}
+        for key in parent:
+            clusters.setdefault(root(key), []).append(key)
+        return [sorted(cluster) for cluster in clusters.values() if len(cluster) > 1]
+
+    def renumbered(self, mapping: Dict[int, int]) -> "DuplicateIndex":
+        """
+        Copy of the index with entry ids replaced (entries missing from mapping are dropped)
+        Args:
+            mapping: Old entry id -> new entry id
+        Returns:
+            New index; hashed entries keep their signatures, deferred ones stay deferred
+        """
+        index = DuplicateIndex(self.threshold, self.hasher.num_perm, self.bands)
+        for old, new in sorted(mapping.items(), key=lambda item: item[1]):
+            if old in self.signatures:
+                index._insert(new, self.signatures[old], self.groups[old])
+                index.groups[new] = self.groups[old]
+        for group, entries in self.pending.items():
+            for old, text in entries:
+                if old in mapping:
+                    index.add(mapping[old], text, group=group, lazy=True)
+        index.dirty = {self.groups[old] for old in mapping if self.groups[old] in self.dirty}
+        return index
+
+    def __len__(self) -> int:
+        return len(self.groups)
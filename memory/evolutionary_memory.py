@@ -2,45 +2,332 @@
 Evolutionary Memory Module - Next Generation
 Records historical errors and solutions with improved error handling
 """
+import atexit
 import json
 import os
+import threading
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 
 from rich.console import Console
+from memory.dedup import DuplicateIndex
+from memory.fingerprint import error_digest, fingerprint_error
+from memory.query_cache import QueryCache
+from memory.search_index import TrigramIndex
+from memory.similarity import SimilarityIndex
+from memory.storage import AppendOnlyStore, DEFAULT_STREAM_THRESHOLD, empty_knowledge_base
 
 console = Console()
 
+
+def _flush_at_exit(memory_ref):
+    """Write out the write-behind buffer of a memory that is still alive at interpreter exit"""
+    memory = memory_ref()
+    if memory is not None:
+        memory.flush()
+
+
+def _compaction_loop(memory_ref, stop: threading.Event, interval: float):
+    """Background job merging near-duplicate pairs every interval seconds while the memory is alive"""
+    while not stop.wait(interval):
+        memory = memory_ref()
+        if memory is None:
+            return
+        if memory._unchecked_pairs:
+            memory.compact_duplicates()
+        del memory
+
+
 class EvolutionaryMemory:
     """Evolutionary Memory Module - records historical errors and solutions"""
     
-    def __init__(self, knowledge_base_file: str = "knowledge_base.json"):
+    def __init__(self, knowledge_base_file: str = "knowledge_base.json", compact_every: int = 1000,
+                 write_behind: bool = True, flush_size: int = 100, flush_interval: float = 2.0,
+                 similarity_top_k: int = 5, min_similarity: float = 0.25,
+                 dedup_threshold: float = 0.8, compaction_interval: Optional[float] = 600.0,
+                 stream_threshold: int = DEFAULT_STREAM_THRESHOLD, auto_refresh: bool = True,
+                 query_cache_size: int = 1024):
         self.knowledge_base_file = knowledge_base_file
+        # Pick up other processes' commits before every lookup
+        self.auto_refresh = auto_refresh
+        # Inserts are journaled; the JSON file is rewritten only on compaction
+        self.store = AppendOnlyStore(knowledge_base_file, compact_every=compact_every,
+                                     stream_threshold=stream_threshold)
         self.knowledge_base = self.load_knowledge_base()
+        self.similarity_top_k = similarity_top_k
+        self.min_similarity = min_similarity
+        self.dedup_threshold = dedup_threshold
+        # Bumped by every change (local or another process's), versions the query cache
+        self.generation = 0
+        self.query_cache = QueryCache(query_cache_size)
+        self._build_indexes()
+        # Pairs added since the last duplicate compaction (loaded pairs were checked when they were added)
+        self._unchecked_pairs = 0
+        # Write-behind buffer: inserts are committed once flush_size are pending, after flush_interval or at exit
+        self.write_behind = write_behind
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._flush_timer = None
+        self._batch_depth = 0
+        self._batch_added = 0
+        atexit.register(_flush_at_exit, weakref.ref(self))
+        self._compaction_stop = threading.Event()
+        self._compaction_thread = None
+        if compaction_interval:
+            self.start_background_compaction(compaction_interval)
     
-    def load_knowledge_base(self) -> Dict[str, Any]:
-        """Load knowledge base from file with error handling"""
-        if os.path.exists(self.knowledge_base_file):
+    def _build_indexes(self):
+        """Index the loaded entries for substring search"""
+        self.generation += 1
+        self.error_index = TrigramIndex()
+        self.context_index = TrigramIndex()
+        # Error fingerprint digest -> positions of the pairs with that fingerprint
+        self.fingerprint_index = {}
+        # Built on first use (similarity query, insert), then kept up to date on insert
+        self.pair_vectors = None
+        self.solution_vectors = None
+        self.duplicates = None
+        # Normalized solution -> positions of loaded pairs not added to the duplicate index yet
+        self._unindexed_pairs = {}
+        for entry in self.knowledge_base["error_solution_pairs"]:
+            self._index_pair(entry)
+        self._index_ids()
+    
+    def _index_ids(self):
+        """Id -> committed entry, for applying other processes' updates (staged entries have no final id yet)"""
+        staged = {id(r["entry"]) for r in self.store.pending if r["op"] == "add"}
+        self._by_id = {name: {e.get("id"): e for e in entries if id(e) not in staged}
+                       for name, entries in self.knowledge_base.items()}
+    
+    def _insert_committed(self, collection: str, entry: Dict[str, Any]):
+        """Append and index an entry another process committed"""
+        self.knowledge_base.setdefault(collection, []).append(entry)
+        self._by_id.setdefault(collection, {})[entry.get("id")] = entry
+        if collection == "error_solution_pairs":
+            self._index_pair(entry)
+            self._unchecked_pairs += 1
+        elif collection == "solutions":
+            self._index_solution(entry)
+    
+    def _merge_foreign(self, reloaded: Optional[Dict[str, Any]], records: List[Dict[str, Any]]):
+        """
+        Fold in what other processes committed (called by the store with its lock held)
+        Args:
+            reloaded: Fresh knowledge base when the files were compacted meanwhile
+            records: Otherwise the new journal records
+        """
+        self.generation += 1
+        if reloaded is None:
+            # Appends only: this process's staged entries keep their positions, new ones go after them
+            for record in records:
+                if record["op"] == "add":
+                    self._insert_committed(record["collection"], record["entry"])
+                else:
+                    entry = self._by_id.get(record["collection"], {}).get(record["index"])
+                    if entry is not None:
+                        AppendOnlyStore.apply_to_entry(entry, record)
+            return
+
+        # Another process rewrote the snapshot (and may have merged entries away):
+        # start from it, then put this process's staged work back on top
+        staged_updates = [r for r in self.store.pending if r["op"] != "add"]
+        for record in self.store.pending:
+            if record["op"] == "add":
+                reloaded.setdefault(record["collection"], []).append(record["entry"])
+        self.knowledge_base = reloaded
+        self._build_indexes()
+        self._unchecked_pairs = 0
+        for record in staged_updates:
+            # Ids are stable across compaction
+            target = self._by_id.get(record["collection"], {}).get(record["index"])
+            if target is None:
+                # Merged away by the other process's compaction
+                self.store.pending.remove(record)
+                continue
+            AppendOnlyStore.apply_to_entry(target, record)
+    
+    def refresh(self):
+        """Pick up entries other processes committed: incrementally, or by reloading after a compaction"""
+        with self._lock:
+            if not self.store.changed():
+                return
             try:
-                with open(self.knowledge_base_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                with self.store.locked(exclusive=False):
+                    reloaded, records = self.store.sync()
+                    if reloaded is not None or records:
+                        self._merge_foreign(reloaded, records)
             except Exception as e:
-                console.print(f"[yellow]加载知识库失败: {e}, 创建新的知识库[/yellow]")
-                return {"errors": [], "solutions": [], "patterns": [], "error_solution_pairs": []}
-        else:
-            # Create a new knowledge base
-            return {"errors": [], "solutions": [], "patterns": [], "error_solution_pairs": []}
+                console.print(f"[yellow]刷新知识库失败: {e}[/yellow]")
+    
+    def _auto_refresh(self):
+        if self.auto_refresh:
+            self.refresh()
+    
+    def _index_pair(self, entry: Dict[str, Any], signature: tuple = None):
+        """Index one error-solution pair (document id == position in error_solution_pairs)"""
+        doc = self.error_index.add(entry["error"])
+        self.context_index.add(entry.get("context", ""))
+        if not entry.get("fingerprint"):
+            # Entries stored before fingerprinting
+            entry["fingerprint"] = error_digest(entry["error"])
+        self.fingerprint_index.setdefault(entry["fingerprint"], []).append(doc)
+        if self.pair_vectors is not None:
+            self.pair_vectors.add(self._pair_text(entry))
+        if self.duplicates is not None:
+            text, group = self._insight(entry)
+            self._duplicate_index(group[-1])
+            self.duplicates.add(doc, text, signature, group)
+    
+    def _index_solution(self, entry: Dict[str, Any]):
+        """Index one general solution (document id == position in solutions)"""
+        if self.solution_vectors is not None:
+            self.solution_vectors.add(self._solution_text(entry))
+    
+    @staticmethod
+    def _pair_text(entry: Dict[str, Any]) -> str:
+        """Text an error-solution pair is matched on"""
+        return f"{entry['error']}\n{entry.get('context', '')}"
+    
+    @staticmethod
+    def _solution_text(entry: Dict[str, Any]) -> str:
+        """Text a general solution is matched on"""
+        return f"{entry.get('description', '')}\n{entry.get('solution', '')}"
+    
+    @staticmethod
+    def _insight(entry: Dict[str, Any]) -> tuple:
+        """
+        How a pair is compared for near-duplicates
+        Returns:
+            (text, group): pairs are only compared within a group, i.e. with the same exception type,
+            the same names in the message and the same solution (so "No module named 'pygame'" never
+            merges into 'numpy'); within it, their normalized messages must nearly match
+        """
+        fingerprint = fingerprint_error(entry["error"])
+        solution = EvolutionaryMemory._solution_key(entry)
+        text = f"{fingerprint['exception']}: {fingerprint['message']}\n{solution}"
+        return text, (fingerprint["exception"], fingerprint["tokens"], solution)
+    
+    @staticmethod
+    def _solution_key(entry: Dict[str, Any]) -> str:
+        """Whitespace-normalized solution, the part of the insight group that is cheap to compute"""
+        return " ".join(entry["solution"].split())
+    
+    def _duplicate_index(self, solution: Optional[str] = None) -> DuplicateIndex:
+        """
+        MinHash/LSH index of the pairs, built on first use. Loaded pairs are only added once a pair
+        with the same solution is looked up, and only hashed once one of their group is
+        Args:
+            solution: Normalized solution about to be looked up
+        """
+        with self._lock:
+            pairs = self.knowledge_base["error_solution_pairs"]
+            if self.duplicates is None:
+                self.duplicates = DuplicateIndex(self.dedup_threshold)
+                self._unindexed_pairs = {}
+                for doc, entry in enumerate(pairs):
+                    self._unindexed_pairs.setdefault(self._solution_key(entry), []).append(doc)
+            for doc in self._unindexed_pairs.pop(solution, ()):
+                text, group = self._insight(pairs[doc])
+                self.duplicates.add(doc, text, group=group, lazy=True)
+            return self.duplicates
+    
+    def _similarity_indexes(self):
+        """TF-IDF indexes of the pairs and the general solutions, built on first use"""
+        with self._lock:
+            if self.pair_vectors is None:
+                self.pair_vectors = SimilarityIndex()
+                self.pair_vectors.rebuild([self._pair_text(e) for e in self.knowledge_base["error_solution_pairs"]])
+                self.solution_vectors = SimilarityIndex()
+                self.solution_vectors.rebuild([self._solution_text(e) for e in self.knowledge_base["solutions"]])
+            return self.pair_vectors, self.solution_vectors
+    
+    def load_knowledge_base(self) -> Dict[str, Any]:
+        """Load knowledge base (snapshot plus journal) from file with error handling"""
+        try:
+            return self.store.load()
+        except Exception as e:
+            console.print(f"[yellow]加载知识库失败: {e}, 创建新的知识库[/yellow]")
+            return empty_knowledge_base()
     
     def save_knowledge_base(self):
-        """Save knowledge base to file with error handling"""
+        """Save knowledge base to file with error handling (folds the journal into a fresh snapshot)"""
         try:
-            with open(self.knowledge_base_file, 'w', encoding='utf-8') as f:
-                json.dump(self.knowledge_base, f, ensure_ascii=False, indent=2)
+            with self._lock, self.store.locked():
+                self._commit()
+                self.store.compact(self.knowledge_base)
+                self._index_ids()
             console.print(f"[green]知识库已保存到 {self.knowledge_base_file}[/green]")
         except Exception as e:
             console.print(f"[red]保存知识库失败: {e}[/red]")
     
+    def _add_entry(self, collection: str, entry: Dict[str, Any], message: str, signature: tuple = None):
+        """Insert an entry, index it and persist it (or leave it to the write-behind buffer)"""
+        with self._lock:
+            self.knowledge_base[collection].append(entry)
+            if collection == "error_solution_pairs":
+                self._index_pair(entry, signature)
+                self._unchecked_pairs += 1
+            elif collection == "solutions":
+                self._index_solution(entry)
+            self.store.append(collection, entry)
+            self._schedule_commit(message)
+    
+    def _schedule_commit(self, message: str):
+        """Commit a staged write now, or leave it to the write-behind buffer or the enclosing batch"""
+        self.generation += 1
+        if self._batch_depth:
+            self._batch_added += 1
+            return
+        console.print(message)
+        if not self.write_behind or len(self.store.pending) >= self.flush_size:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def _commit(self) -> bool:
+        """Commit the staged records after whatever other processes committed; returns whether compaction is due"""
+        staged = [r for r in self.store.pending if r["op"] == "add"]
+        due = self.store.commit(self._merge_foreign)
+        for record in staged:
+            self._by_id.setdefault(record["collection"], {})[record["entry"]["id"]] = record["entry"]
+        return due
+    
+    def flush(self):
+        """Durably write every buffered entry with a single commit"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            try:
+                with self.store.locked():
+                    if self._commit():
+                        self.store.compact(self.knowledge_base)
+                        self._index_ids()
+            except Exception as e:
+                console.print(f"[red]保存知识库失败: {e}[/red]")
+    
+    @contextmanager
+    def batch(self):
+        """Group inserts: nothing is written or printed per entry, and the batch is committed once at the end"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    added, self._batch_added = self._batch_added, 0
+                    self.flush()
+                    if added:
+                        console.print(f"[green]已批量记录 {added} 条知识[/green]")
+    
     def add_error_solution_pair(self, error: str, solution: str, context: str = ""):
         """Add an error-solution pair to the knowledge base"""
         entry = {
@@ -48,25 +335,97 @@ class EvolutionaryMemory:
             "solution": solution,
             "context": context,
             "timestamp": datetime.now().isoformat(),
-            "id": len(self.knowledge_base["error_solution_pairs"])
+            "hits": 1,
+            "fingerprint": error_digest(error)
         }
-        
-        self.knowledge_base["error_solution_pairs"].append(entry)
-        console.print(f"[green]错误解决方案已记录: {error[:50]}...[/green]")
-        self.save_knowledge_base()
+        with self._lock:
+            self._auto_refresh()
+            pairs = self.knowledge_base["error_solution_pairs"]
+            # Same fingerprint and solution: a hash hit, no need for MinHash
+            duplicate = next((doc for doc in self.fingerprint_index.get(entry["fingerprint"], ())
+                              if pairs[doc]["solution"] == solution), None)
+            signature = None
+            if duplicate is None:
+                text, group = self._insight(entry)
+                duplicates = self._duplicate_index(group[-1])
+                signature = duplicates.hasher.signature(text)
+                duplicate = duplicates.find(signature=signature, group=group)
+            if duplicate is None:
+                self._add_entry("error_solution_pairs", entry, f"[green]错误解决方案已记录: {error[:50]}...[/green]",
+                                signature)
+                return
+            # The same insight again: count it on the existing entry instead of storing a copy
+            existing = pairs[duplicate]
+            existing["hits"] = existing.get("hits", 1) + 1
+            existing["last_seen"] = entry["timestamp"]
+            if self._by_id["error_solution_pairs"].get(existing["id"]) is existing:
+                self.store.hit("error_solution_pairs", existing["id"], entry["timestamp"])
+            # (a still staged entry is written with its updated count)
+            self._schedule_commit(f"[green]重复的错误解决方案已合并: {error[:50]}... (命中 {existing['hits']} 次)[/green]")
+    
+    def compact_duplicates(self) -> int:
+        """
+        Merge clusters of near-duplicate pairs into their oldest entry, summing their hit counts
+        Returns:
+            Number of entries removed
+        """
+        with self._lock, self.store.locked():
+            self.flush()
+            pairs = self.knowledge_base["error_solution_pairs"]
+            duplicates = self._duplicate_index()
+            unindexed = self._unindexed_pairs
+            self._unchecked_pairs = 0
+            merged = set()
+            for cluster in duplicates.clusters():
+                keep = pairs[cluster[0]]
+                keep["hits"] = sum(pairs[doc].get("hits", 1) for doc in cluster)
+                keep["last_seen"] = max(pairs[doc].get("last_seen", pairs[doc].get("timestamp", "")) for doc in cluster)
+                merged.update(cluster[1:])
+            if not merged:
+                return 0
+
+            kept = [doc for doc in range(len(pairs)) if doc not in merged]
+            self.knowledge_base["error_solution_pairs"] = [pairs[doc] for doc in kept]
+            # Removals are not journaled: write a fresh snapshot (entries keep their ids)
+            try:
+                self.store.compact(self.knowledge_base)
+            except Exception as e:
+                console.print(f"[red]保存知识库失败: {e}[/red]")
+            self._build_indexes()
+            positions = {doc: position for position, doc in enumerate(kept)}
+            self.duplicates = duplicates.renumbered(positions)
+            self._unindexed_pairs = {solution: [positions[doc] for doc in docs if doc in positions]
+                                     for solution, docs in unindexed.items()}
+        console.print(f"[green]已合并 {len(merged)} 条重复的错误解决方案[/green]")
+        return len(merged)
+    
+    def start_background_compaction(self, interval: float = 600.0):
+        """
+        Run compact_duplicates on a daemon thread every interval seconds (when pairs were added since the last run)
+        Args:
+            interval: Seconds between runs
+        """
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_stop.clear()
+            self._compaction_thread = threading.Thread(
+                target=_compaction_loop, args=(weakref.ref(self), self._compaction_stop, interval),
+                name="knowledge-base-compaction", daemon=True)
+            self._compaction_thread.start()
+    
+    def stop_background_compaction(self):
+        """Stop the background compaction job"""
+        self._compaction_stop.set()
     
     def add_solution(self, solution: str, description: str = ""):
         """Add a general solution to the knowledge base"""
         entry = {
             "solution": solution,
             "description": description,
-            "timestamp": datetime.now().isoformat(),
-            "id": len(self.knowledge_base["solutions"])
+            "timestamp": datetime.now().isoformat()
         }
-        
-        self.knowledge_base["solutions"].append(entry)
-        console.print(f"[green]解决方案已记录: {description[:50]}...[/green]")
-        self.save_knowledge_base()
+        self._add_entry("solutions", entry, f"[green]解决方案已记录: {description[:50]}...[/green]")
     
     def add_pattern(self, pattern: str, description: str = "", solution: str = ""):
         """Add a pattern to the knowledge base"""
@@ -74,29 +433,59 @@ class EvolutionaryMemory:
             "pattern": pattern,
             "description": description,
             "solution": solution,
-            "timestamp": datetime.now().isoformat(),
-            "id": len(self.knowledge_base["patterns"])
+            "timestamp": datetime.now().isoformat()
         }
-        
-        self.knowledge_base["patterns"].append(entry)
-        console.print(f"[green]模式已记录: {description[:50]}...[/green]")
-        self.save_knowledge_base()
+        self._add_entry("patterns", entry, f"[green]模式已记录: {description[:50]}...[/green]")
+    
+    def _cached(self, key: tuple, compute) -> list:
+        """
+        Answer a lookup from the query cache, or compute and cache it
+        Args:
+            key: Method name and arguments
+            compute: Computes the result from the current knowledge base
+        Returns:
+            A fresh list, so callers may modify it
+        """
+        self._auto_refresh()
+        found, result = self.query_cache.get(key, self.generation)
+        if not found:
+            # The pair list and its indexes are rebuilt together under the lock (compaction,
+            # reloads), so compute from one consistent generation of them
+            with self._lock:
+                generation = self.generation
+                result = compute()
+            self.query_cache.put(key, result, generation)
+        return list(result)
+    
+    def query_cache_stats(self) -> Dict[str, Any]:
+        """Hit-rate statistics of the lookup cache"""
+        return self.query_cache.stats()
     
     def search_by_error(self, error_query: str) -> List[Dict[str, Any]]:
         """Search for similar errors in the knowledge base"""
-        results = []
-        for entry in self.knowledge_base["error_solution_pairs"]:
-            if error_query.lower() in entry["error"].lower():
-                results.append(entry)
-        return results
+        return self._cached(("error", error_query), lambda: self._search_index(self.error_index, error_query))
+    
+    def search_by_fingerprint(self, error: str) -> List[Dict[str, Any]]:
+        """
+        Pairs whose error has the same fingerprint (same exception, normalized message and project frames)
+        Args:
+            error: Raw error output or traceback
+        Returns:
+            Matching entries, oldest first
+        """
+        return self._cached(("fingerprint", error), lambda: self._search_fingerprint(error))
     
     def search_by_context(self, context_query: str) -> List[Dict[str, Any]]:
         """Search for entries by context"""
-        results = []
-        for entry in self.knowledge_base["error_solution_pairs"]:
-            if context_query.lower() in entry.get("context", "").lower():
-                results.append(entry)
-        return results
+        return self._cached(("context", context_query), lambda: self._search_index(self.context_index, context_query))
+    
+    def _search_index(self, index: TrigramIndex, query: str) -> List[Dict[str, Any]]:
+        pairs = self.knowledge_base["error_solution_pairs"]
+        return [pairs[doc] for doc in index.search(query)]
+    
+    def _search_fingerprint(self, error: str) -> List[Dict[str, Any]]:
+        pairs = self.knowledge_base["error_solution_pairs"]
+        return [pairs[doc] for doc in self.fingerprint_index.get(error_digest(error), ())]
     
     def get_common_solutions(self) -> List[Dict[str, Any]]:
         """Get commonly used solutions"""
@@ -106,29 +495,83 @@ class EvolutionaryMemory:
         """Get known patterns"""
         return self.knowledge_base["patterns"]
     
+    def search_similar(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Error-solution pairs most similar to query (TF-IDF cosine over character n-grams)
+        Args:
+            query: Error message or context
+            top_k: Maximum number of results
+        Returns:
+            Matching entries with a "score" field, best first
+        """
+        def compute():
+            pair_vectors, _ = self._similarity_indexes()
+            pairs = self.knowledge_base["error_solution_pairs"]
+            return [dict(pairs[doc], score=round(score, 4))
+                    for doc, score in pair_vectors.search(query, top_k, self.min_similarity)]
+        return self._cached(("similar", query, top_k), compute)
+    
     def apply_solutions(self, error_context: str) -> List[str]:
         """Apply relevant solutions based on error context"""
+        return self._cached(("solutions", error_context), lambda: self._apply_solutions(error_context))
+    
+    def _apply_solutions(self, error_context: str) -> List[str]:
         solutions = []
         
-        # Search for similar errors
-        error_matches = self.search_by_error(error_context)
-        for match in error_matches:
-            solutions.append(match["solution"])
-        
-        # Search by context
-        context_matches = self.search_by_context(error_context)
-        for match in context_matches:
+        # Exact matches first: same fingerprint, then substrings
+        exact = self._search_fingerprint(error_context)
+        for match in (exact + self._search_index(self.error_index, error_context)
+                      + self._search_index(self.context_index, error_context)):
             if match["solution"] not in solutions:
                 solutions.append(match["solution"])
         
-        # Add common solutions that might be relevant
-        for solution_entry in self.get_common_solutions():
-            if "linux" in error_context.lower() and "linux" in solution_entry.get("description", "").lower():
-                solutions.append(solution_entry["solution"])
-            elif "python" in error_context.lower() and "python" in solution_entry.get("description", "").lower():
-                solutions.append(solution_entry["solution"])
+        # Then the most similar errors and general solutions
+        pair_vectors, solution_vectors = self._similarity_indexes()
+        pairs = self.knowledge_base["error_solution_pairs"]
+        for doc, _ in pair_vectors.search(error_context, self.similarity_top_k, self.min_similarity):
+            if pairs[doc]["solution"] not in solutions:
+                solutions.append(pairs[doc]["solution"])
+        common_solutions = self.get_common_solutions()
+        for doc, _ in solution_vectors.search(error_context, self.similarity_top_k, self.min_similarity):
+            if common_solutions[doc]["solution"] not in solutions:
+                solutions.append(common_solutions[doc]["solution"])
         
         return solutions
 
-# Global instance
-evolutionary_memory = EvolutionaryMemory()
\ No newline at end of file
+class LazyEvolutionaryMemory:
+    """
+    Stand-in for the shared EvolutionaryMemory that loads the knowledge base on first use,
+    so importing a role (or tooling such as verify_nextgen.py) does not read the file
+    """
+    
+    def __init__(self, knowledge_base_file: Optional[str] = None, **options):
+        """
+        Initialize the stand-in
+        Args:
+            knowledge_base_file: Knowledge base path, defaults to $KNOWLEDGE_BASE_FILE or knowledge_base.json
+            options: Further EvolutionaryMemory arguments
+        """
+        self._knowledge_base_file = knowledge_base_file
+        self._options = options
+        self._instance = None
+        self._lock = threading.Lock()
+    
+    def get(self) -> EvolutionaryMemory:
+        """The real memory, created on the first call"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    path = self._knowledge_base_file or os.getenv("KNOWLEDGE_BASE_FILE", "knowledge_base.json")
+                    self._instance = EvolutionaryMemory(path, **self._options)
+        return self._instance
+    
+    @property
+    def loaded(self) -> bool:
+        """Whether the knowledge base has been loaded"""
+        return self._instance is not None
+    
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+# Global instance (loaded on first access)
+evolutionary_memory = LazyEvolutionaryMemory()
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Error Fingerprinting - Next Generation
+Reduces raw stderr / tracebacks to a stable signature, so the same failure in another run maps to the same key
+"""
+import hashlib
+import re
+from typing import Dict, Any, List
+
+FRAME = re.compile(r'^\s*File "(?P<path>[^"]+)", line \d+(?:, in (?P<function>.+))?\s*$')
+# "ValueError: ...", "requests.exceptions.ConnectionError: ...", "KeyboardInterrupt"
+EXCEPTION_LINE = re.compile(r"^(?P<type>[A-Za-z_][\w.]*(?:Error|Exception|Warning|Exit|Interrupt|Iteration)\w*)(?::\s*(?P<message>.*))?$")
+# Frames from these locations are library code, not the project
+LIBRARY_PATH = re.compile(r"(site-packages|dist-packages|[/\\]lib[/\\]python\d|^<frozen |^<string>$)")
+# Innermost project frames kept in the signature
+SIGNATURE_FRAMES = 3
+
+_ADDRESS = re.compile(r"0x[0-9a-fA-F]+")
+_UUID = re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")
+_LONG_HEX = re.compile(r"\b(?=[0-9a-f]*[a-f])(?=[0-9a-f]*\d)[0-9a-f]{16,}\b")
+_TEMP_NAME = re.compile(r"\btmp[a-z0-9_]{6,}")
+_PATH = re.compile(r"(?:[A-Za-z]:\\|/)(?:[^\s'\"():,]+[/\\])*([^\s'\"():,/\\]*)")
+_LINE_NUMBER = re.compile(r"\bline \d+")
+_COLON_NUMBER = re.compile(r"(\.\w+):\d+(?::\d+)?")
+_LONG_NUMBER = re.compile(r"\b\d{5,}\b")
+# Quoted names in a message: the module, attribute, key or file the error is about
+_QUOTED = re.compile(r"'([^'\n]*)'|\"([^\"\n]*)\"")
+
+
+def normalize_message(message: str) -> str:
+    """
+    Strip the run-specific parts of an error message
+    Args:
+        message: Exception message or any error text
+    Returns:
+        Message with addresses, ids, temp names, directories, line numbers and long numbers replaced
+    """
+    text = _UUID.sub("<uuid>", message)
+    text = _ADDRESS.sub("0x?", text)
+    text = _LONG_HEX.sub("<hex>", text)
+    text = _TEMP_NAME.sub("tmp*", text)
+    # Directories differ between machines and sandboxes: keep only the file name
+    text = _PATH.sub(lambda match: match.group(1) or "/", text)
+    text = _LINE_NUMBER.sub("line N", text)
+    text = _COLON_NUMBER.sub(r"\1:N", text)
+    text = _LONG_NUMBER.sub("<n>", text)
+    return " ".join(text.split())
+
+
+def key_tokens(message: str) -> tuple:
+    """
+    Identifiers an error message is about
+    Args:
+        message: Exception message (normalized or raw)
+    Returns:
+        The quoted names in order, e.g. ("pygame",) for "No module named 'pygame'"
+    """
+    return tuple(single or double for single, double in _QUOTED.findall(message))
+
+
+def _frame_name(path: str, function: str) -> str:
+    return f"{normalize_message(path)}:{(function or '?').strip()}"
+
+
+def parse_error(text: str) -> Dict[str, Any]:
+    """
+    Split error output into the final exception and the project frames leading to it
+    Args:
+        text: stderr output, a traceback or a bare error message
+    Returns:
+        {"exception", "message", "frames"}; exception is empty if no exception line was found
+    """
+    lines = (text or "").strip().splitlines()
+    frames: List[str] = []
+    exception, message = "", ""
+    for line in lines:
+        frame = FRAME.match(line)
+        if frame:
+            if not LIBRARY_PATH.search(frame.group("path")):
+                frames.append(_frame_name(frame.group("path"), frame.group("function")))
+            continue
+        match = EXCEPTION_LINE.match(line.strip())
+        if match and not line[:1].isspace():
+            # The last exception wins (chained tracebacks end with the one that propagated)
+            exception, message = match.group("type"), match.group("message") or ""
+        if line.startswith("Traceback (most recent call last)"):
+            frames = []
+    if not exception:
+        message = text or ""
+    return {"exception": exception, "message": message, "frames": frames}
+
+
+def fingerprint_error(text: str) -> Dict[str, Any]:
+    """
+    Stable signature of an error
+    Args:
+        text: stderr output, a traceback or a bare error message
+    Returns:
+        {"exception", "message" (normalized), "tokens" (quoted names in the message),
+        "frames" (innermost project frames), "signature", "digest"}
+    """
+    parsed = parse_error(text)
+    message = normalize_message(parsed["message"])
+    frames = parsed["frames"][-SIGNATURE_FRAMES:]
+    signature = f"{parsed['exception']}: {message}" if parsed["exception"] else message
+    if frames:
+        signature += " @ " + " > ".join(frames)
+    return {
+        "exception": parsed["exception"],
+        "message": message,
+        "tokens": key_tokens(message),
+        "frames": frames,
+        "signature": signature,
+        "digest": hashlib.sha1(signature.encode("utf-8")).hexdigest()[:16]
+    }
+
+
+def error_digest(text: str) -> str:
+    """Fingerprint digest of an error, the exact-match key of the knowledge base"""
+    return fingerprint_error(text)["digest"]
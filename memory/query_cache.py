@@ -0,0 +1,87 @@
+"""
+Query Cache - Next Generation
+In-process LRU cache of knowledge base lookups, invalidated by the knowledge base generation
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+
+class QueryCache:
+    """
+    Lookup key -> result, valid for one knowledge base generation; the first lookup at a newer
+    generation drops everything cached before it
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Initialize the cache
+        Args:
+            max_entries: Results kept before the least recently used is evicted (0 disables caching)
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _sync(self, generation: int):
+        """Drop the results of older generations"""
+        if generation != self.generation:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self.generation = generation
+
+    def get(self, key: Hashable, generation: int) -> Tuple[bool, Any]:
+        """
+        Look up a result
+        Args:
+            key: Lookup key (method and arguments)
+            generation: Current knowledge base generation
+        Returns:
+            (found, result)
+        """
+        with self._lock:
+            self._sync(generation)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Any, generation: int):
+        """
+        Store a result computed at generation (ignored if the knowledge base changed meanwhile)
+        """
+        with self._lock:
+            if self.max_entries <= 0 or (self.generation is not None and generation < self.generation):
+                return
+            self._sync(generation)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
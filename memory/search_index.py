@@ -0,0 +1,77 @@
+"""
+Search Index - Next Generation
+Incremental trigram index answering case-insensitive substring queries over knowledge base text
+"""
+from typing import List, Set
+
+# Queries shorter than this have no trigrams and fall back to a scan of the normalized texts
+NGRAM = 3
+
+
+def normalize_text(text: str) -> str:
+    """Form text is indexed and queried in"""
+    return (text or "").lower()
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Distinct character trigrams of normalized text"""
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class TrigramIndex:
+    """
+    Inverted index from character trigrams to document ids (positions in insertion order)
+    """
+
+    def __init__(self):
+        """Initialize an empty index"""
+        self.texts = []
+        self.postings = {}
+
+    def add(self, text: str) -> int:
+        """
+        Index one document
+        Args:
+            text: Raw text; it is normalized once here instead of on every query
+        Returns:
+            Document id
+        """
+        doc = len(self.texts)
+        normalized = normalize_text(text)
+        self.texts.append(normalized)
+        for gram in _trigrams(normalized):
+            self.postings.setdefault(gram, set()).add(doc)
+        return doc
+
+    def rebuild(self, texts: List[str]):
+        """Replace the index contents, e.g. after entries were reordered or removed"""
+        self.texts = []
+        self.postings = {}
+        for text in texts:
+            self.add(text)
+
+    def search(self, query: str) -> List[int]:
+        """
+        Documents containing query as a case-insensitive substring
+        Args:
+            query: Text to look for
+        Returns:
+            Matching document ids in insertion order
+        """
+        normalized = normalize_text(query)
+        if len(normalized) < NGRAM:
+            return [doc for doc, text in enumerate(self.texts) if normalized in text]
+
+        postings = []
+        for gram in _trigrams(normalized):
+            docs = self.postings.get(gram)
+            if not docs:
+                return []
+            postings.append(docs)
+        # Intersect starting from the rarest trigram, then confirm the candidates really contain the query
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return sorted(doc for doc in candidates if normalized in self.texts[doc])
+
+    def __len__(self) -> int:
+        return len(self.texts)
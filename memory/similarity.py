@@ -0,0 +1,151 @@
+"""
+Similarity Index - Next Generation
+Incremental TF-IDF retrieval over character n-grams, scored with NumPy
+"""
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy
+
+from memory.search_index import normalize_text
+
+# Character n-gram lengths taken inside each word (padded with spaces, so word edges count)
+NGRAM_SIZES = (3, 4)
+# n-grams found in more than this share of the documents carry almost no signal and are not scored
+MAX_DOCUMENT_FREQUENCY = 0.5
+# Query n-grams scored at most (the highest weighted ones)
+MAX_QUERY_NGRAMS = 32
+WORD = re.compile(r"\w+")
+
+
+def char_ngrams(text: str) -> Counter:
+    """Character n-gram counts of normalized text"""
+    grams = []
+    for word in WORD.findall(normalize_text(text)):
+        padded = f" {word} "
+        for size in NGRAM_SIZES:
+            grams.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+    return Counter(grams)
+
+
+def _unit_weights(counts: Dict[str, float]) -> Dict[str, float]:
+    """Sublinear term frequencies scaled to unit length"""
+    weights = {gram: 1.0 + math.log(count) if count > 1 else 1.0 for gram, count in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    return {gram: w / norm for gram, w in weights.items()}
+
+
+class _Postings:
+    """Document ids and weights of one n-gram; inserts go to lists and are packed into arrays on demand"""
+
+    __slots__ = ("docs", "weights", "pending_docs", "pending_weights")
+
+    def __init__(self):
+        self.docs = self.weights = None
+        self.pending_docs = []
+        self.pending_weights = []
+
+    def __len__(self) -> int:
+        return len(self.pending_docs) + (len(self.docs) if self.docs is not None else 0)
+
+    def arrays(self):
+        """(doc ids, weights) as NumPy arrays"""
+        if self.pending_docs:
+            docs = numpy.array(self.pending_docs, dtype=numpy.int32)
+            weights = numpy.array(self.pending_weights, dtype=numpy.float32)
+            if self.docs is not None:
+                docs = numpy.concatenate((self.docs, docs))
+                weights = numpy.concatenate((self.weights, weights))
+            self.docs, self.weights = docs, weights
+            self.pending_docs, self.pending_weights = [], []
+        return self.docs, self.weights
+
+
+class SimilarityIndex:
+    """
+    Sparse document-term matrix stored column-wise (n-gram -> postings), so inserts only append.
+    Documents keep unit-length sublinear TF vectors; IDF is applied on the query side with the
+    current document frequencies, so the cosine scores stay correct as the collection grows.
+    """
+
+    def __init__(self):
+        """Initialize an empty index"""
+        self.size = 0
+        self.postings = {}
+
+    def add(self, text: str) -> int:
+        """
+        Index one document
+        Args:
+            text: Raw text
+        Returns:
+            Document id (position in insertion order)
+        """
+        doc = self.size
+        index = self.postings
+        for gram, weight in _unit_weights(char_ngrams(text)).items():
+            postings = index.get(gram)
+            if postings is None:
+                postings = index[gram] = _Postings()
+            postings.pending_docs.append(doc)
+            postings.pending_weights.append(weight)
+        self.size += 1
+        return doc
+
+    def rebuild(self, texts: List[str]):
+        """Replace the index contents, e.g. after entries were merged or removed"""
+        self.size = 0
+        self.postings = {}
+        for text in texts:
+            self.add(text)
+
+    def _query_weights(self, query: str) -> Dict[str, float]:
+        """Unit-length TF-IDF weights of the query n-grams that are worth scoring"""
+        weights = {}
+        for gram, weight in _unit_weights(char_ngrams(query)).items():
+            postings = self.postings.get(gram)
+            if postings is None:
+                continue
+            frequency = len(postings)
+            if frequency > MAX_DOCUMENT_FREQUENCY * self.size and self.size >= 10:
+                continue
+            idf = math.log((1 + self.size) / (1 + frequency)) + 1.0
+            # idf squared: once for the query vector and once for the document vector
+            weights[gram] = weight * idf * idf
+        if len(weights) > MAX_QUERY_NGRAMS:
+            # Long queries (whole tracebacks) are cut down to their most informative n-grams
+            weights = dict(heapq.nlargest(MAX_QUERY_NGRAMS, weights.items(), key=lambda item: item[1]))
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {gram: w / norm for gram, w in weights.items()}
+
+    def search(self, query: str, top_k: int = 5, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Documents most similar to query
+        Args:
+            query: Text to compare against
+            top_k: Maximum number of results
+            min_score: Drop results scoring at or below this
+        Returns:
+            (document id, score) pairs, best first
+        """
+        weights = self._query_weights(query)
+        if not weights or top_k <= 0:
+            return []
+
+        scores = numpy.zeros(self.size, dtype=numpy.float32)
+        for gram, query_weight in weights.items():
+            docs, doc_weights = self.postings[gram].arrays()
+            # Document ids are unique within a posting list, so a fancy-indexed add is exact
+            scores[docs] += numpy.float32(query_weight) * doc_weights
+        if top_k < self.size:
+            candidates = numpy.argpartition(-scores, top_k)[:top_k]
+        else:
+            candidates = numpy.arange(self.size)
+        ranked = sorted(candidates.tolist(), key=lambda doc: (-scores[doc], doc))
+        return [(doc, float(scores[doc])) for doc in ranked if scores[doc] > min_score]
+
+    def __len__(self) -> int:
+        return self.size
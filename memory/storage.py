@@ -0,0 +1,445 @@
+"""
+Knowledge Base Storage - Next Generation
+Crash-safe append-only journal with periodic compaction into a JSON snapshot
+"""
+import codecs
+import json
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from workspace.writer import DEFAULT_FILE_MODE
+
+try:
+    import fcntl
+except ImportError:
+    # Not POSIX: no inter-process locking, one process per knowledge base
+    fcntl = None
+
+# Key in the snapshot recording the last journal record it contains
+SEQUENCE_KEY = "_log_sequence"
+# Key in the snapshot recording the next entry id of every collection
+NEXT_ID_KEY = "_next_id"
+# Snapshots from this size on are decoded entry by entry from a memory map instead of json.load
+DEFAULT_STREAM_THRESHOLD = 64 * 1024 * 1024
+
+
+def empty_knowledge_base() -> Dict[str, Any]:
+    """Collections of a new knowledge base"""
+    return {"errors": [], "solutions": [], "patterns": [], "error_solution_pairs": []}
+
+
+def _fsync_directory(path: str):
+    """Make a rename in a directory durable"""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class _StreamReader:
+    """JSON tokens read from a memory-mapped file through a small sliding text window"""
+
+    def __init__(self, data: mmap.mmap, chunk_size: int):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.decoder = json.JSONDecoder()
+        self.text = ""
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        """Decode the next chunk into the window; False at end of file"""
+        if self.offset >= len(self.data):
+            return False
+        chunk = self.data[self.offset:self.offset + self.chunk_size]
+        self.offset += len(chunk)
+        final = self.offset >= len(self.data)
+        # Drop what was consumed so the window stays about one chunk long
+        self.text = self.text[self.pos:] + self.utf8.decode(chunk, final)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of knowledge base snapshot")
+
+    def expect(self, characters: str) -> str:
+        """Consume the next character, which must be one of characters"""
+        character = self.peek()
+        if character not in characters:
+            raise ValueError(f"Malformed knowledge base snapshot: expected one of {characters!r}, got {character!r}")
+        self.pos += 1
+        return character
+
+    def value(self) -> Any:
+        """Decode the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # A number cut at the window's edge ("1", "1.", "1e") may continue in the next chunk
+            if (end == len(self.text) or self.text[end] not in ",:]} \t\r\n") and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def stream_load(path: str, chunk_size: int = 1 << 20) -> Dict[str, Any]:
+    """
+    Load a snapshot without materializing the whole file as one string
+    Args:
+        path: Snapshot file (a JSON object whose values are lists of entries or scalars)
+        chunk_size: Bytes decoded at a time
+    Returns:
+        The decoded object
+    Raises:
+        ValueError: If the snapshot is not valid JSON
+    """
+    data = {}
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        reader = _StreamReader(mapped, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return data
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            if reader.peek() == "[":
+                # Entry lists are decoded one entry at a time
+                reader.expect("[")
+                entries = data[key] = []
+                if reader.peek() == "]":
+                    reader.expect("]")
+                else:
+                    while True:
+                        entries.append(reader.value())
+                        if reader.expect(",]") == "]":
+                            break
+            else:
+                data[key] = reader.value()
+            if reader.expect(",}") == "}":
+                return data
+
+
+class AppendOnlyStore:
+    """
+    Snapshot file (the knowledge base JSON) plus a journal of the records added since the snapshot.
+    Inserts append one line to the journal instead of rewriting the whole file.
+    Several processes may share the files: writers serialize on an exclusive lock of <file>.lock,
+    catch up with the journal first and number their records after everyone else's. Entry ids are
+    assigned at commit from a per-collection counter kept in the snapshot, so an id is never reused,
+    even after compaction removed entries.
+    """
+
+    def __init__(self, snapshot_path: str, compact_every: int = 1000, fsync: bool = True,
+                 stream_threshold: int = DEFAULT_STREAM_THRESHOLD):
+        """
+        Initialize the store
+        Args:
+            snapshot_path: Knowledge base JSON file; the journal lives next to it with a .log suffix
+            compact_every: Journal records after which the journal is folded into the snapshot
+            fsync: Flush commits to stable storage
+            stream_threshold: Snapshot size in bytes from which it is streamed from a memory map
+        """
+        self.snapshot_path = snapshot_path
+        self.log_path = snapshot_path + ".log"
+        self.lock_path = snapshot_path + ".lock"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.stream_threshold = stream_threshold
+        self.sequence = 0
+        self.pending = []
+        self.log_records = 0
+        # Next id per collection, and entries staged on top of it
+        self.next_ids = {}
+        self._staged = {}
+        # How far this process has read the journal, and which snapshot it read it against
+        self.log_offset = 0
+        self.snapshot_sequence = 0
+        self.snapshot_identity = None
+        self._lock_file = None
+        self._lock_depth = 0
+
+    @contextmanager
+    def locked(self, exclusive: bool = True):
+        """
+        Hold the inter-process lock (re-entrant; an inner request inherits the outer mode)
+        Args:
+            exclusive: Writer lock; readers take a shared one
+        """
+        if self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        if self._lock_file is None:
+            self._lock_file = open(self.lock_path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self._lock_depth = 1
+        try:
+            yield
+        finally:
+            self._lock_depth = 0
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _snapshot_stat(self):
+        """Identity of the snapshot file; compaction replaces it with a new one"""
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _log_size(self) -> int:
+        try:
+            return os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return 0
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Read the snapshot and replay the journal on top of it
+        Returns:
+            Knowledge base dict
+        Raises:
+            ValueError: If the snapshot is not valid JSON
+        """
+        with self.locked(exclusive=False):
+            data = empty_knowledge_base()
+            snapshot_sequence = 0
+            self.snapshot_identity = self._snapshot_stat()
+            if self.snapshot_identity is not None:
+                if self.snapshot_identity[2] >= max(self.stream_threshold, 1):
+                    data.update(stream_load(self.snapshot_path))
+                else:
+                    with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                        data.update(json.load(f))
+                snapshot_sequence = data.pop(SEQUENCE_KEY, 0)
+                next_ids = data.pop(NEXT_ID_KEY, {})
+            else:
+                next_ids = {}
+
+            # Snapshots written before the counter was kept numbered entries by position
+            self.next_ids = {name: max(next_ids.get(name, 0), self._max_id(entries) + 1)
+                             for name, entries in data.items() if isinstance(entries, list)}
+            self.snapshot_sequence = self.sequence = snapshot_sequence
+            self.log_offset = self.log_records = 0
+            by_id = {}
+            for record in self._read_log():
+                self.apply(data, record, by_id)
+            return data
+
+    @staticmethod
+    def _max_id(entries: List[Any]) -> int:
+        return max((entry.get("id", -1) for entry in entries if isinstance(entry, dict)), default=-1)
+
+    def _read_log(self) -> List[Dict[str, Any]]:
+        """
+        Journal records past log_offset that are not yet in the snapshot; stops before a torn last
+        line left by a crash mid-write (the next writer truncates it)
+        """
+        records = []
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return records
+        with f:
+            f.seek(self.log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self.log_offset += len(line)
+                self.log_records += 1
+                # Records already folded into the snapshot (compaction interrupted before truncating the journal)
+                if record["seq"] > self.snapshot_sequence:
+                    records.append(record)
+                    self.sequence = max(self.sequence, record["seq"])
+                    if record["op"] == "add":
+                        collection = record["collection"]
+                        self.next_ids[collection] = max(self.next_ids.get(collection, 0), record["entry"]["id"] + 1)
+        return records
+
+    def changed(self) -> bool:
+        """Whether another process committed or compacted since this store last read the files"""
+        return self._log_size() != self.log_offset or self._snapshot_stat() != self.snapshot_identity
+
+    def sync(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Catch up with what other processes committed (call with the lock held)
+        Returns:
+            (full knowledge base if the files were compacted meanwhile, else None;
+             otherwise the new journal records to apply)
+        """
+        if self._snapshot_stat() != self.snapshot_identity or self._log_size() < self.log_offset:
+            pending, self.pending = self.pending, []
+            data = self.load()
+            self.pending = pending
+            return data, []
+        return None, self._read_log()
+
+    @staticmethod
+    def apply(data: Dict[str, Any], record: Dict[str, Any], by_id: Dict[str, Dict[int, Any]] = None):
+        """
+        Apply one journal record to a knowledge base dict
+        Args:
+            data: Knowledge base
+            record: Journal record
+            by_id: Collection -> id -> entry cache shared by the calls replaying one journal
+        """
+        by_id = {} if by_id is None else by_id
+        collection = record["collection"]
+        if record["op"] == "add":
+            data.setdefault(collection, []).append(record["entry"])
+            if collection in by_id:
+                by_id[collection][record["entry"]["id"]] = record["entry"]
+            return
+        if collection not in by_id:
+            by_id[collection] = {entry.get("id"): entry for entry in data.get(collection, [])}
+        entry = by_id[collection].get(record["index"])
+        if entry is not None:
+            AppendOnlyStore.apply_to_entry(entry, record)
+
+    @staticmethod
+    def apply_to_entry(entry: Dict[str, Any], record: Dict[str, Any]):
+        """Apply an update or hit record to the entry it targets"""
+        if record["op"] == "update":
+            entry.update(record["fields"])
+        elif record["op"] == "hit":
+            entry["hits"] = entry.get("hits", 1) + 1
+            entry["last_seen"] = record["last_seen"]
+
+    def append(self, collection: str, entry: Dict[str, Any]):
+        """
+        Stage an insert; it becomes durable on the next commit
+        Args:
+            collection: Knowledge base list the entry belongs to
+            entry: Entry to add; its id is provisional until the commit numbers it
+        """
+        entry["id"] = self.next_ids.get(collection, 0) + self._staged.get(collection, 0)
+        self._staged[collection] = self._staged.get(collection, 0) + 1
+        self.pending.append({"op": "add", "collection": collection, "entry": entry})
+
+    def update(self, collection: str, index: int, fields: Dict[str, Any]):
+        """
+        Stage a change to the fields of an existing entry; it becomes durable on the next commit
+        Args:
+            collection: Knowledge base list the entry belongs to
+            index: Id of a committed entry
+            fields: Fields to overwrite
+        """
+        self.pending.append({"op": "update", "collection": collection, "index": index, "fields": fields})
+
+    def hit(self, collection: str, index: int, last_seen: str):
+        """
+        Stage one more occurrence of an existing entry (an increment, so concurrent hits add up)
+        Args:
+            collection: Knowledge base list the entry belongs to
+            index: Id of a committed entry
+            last_seen: Timestamp of the occurrence
+        """
+        self.pending.append({"op": "hit", "collection": collection, "index": index, "last_seen": last_seen})
+
+    def commit(self, merge: Callable = None) -> bool:
+        """
+        Write all staged records with a single append (and fsync) under the exclusive lock
+        Args:
+            merge: Called as merge(reloaded, records) with what other processes committed since the
+                last sync, before the staged records are numbered; it must fold them into the caller's
+                data; staged entries are numbered after them
+        Returns:
+            Whether the journal is due for compaction
+        """
+        with self.locked():
+            reloaded, records = self.sync()
+            if merge is not None and (reloaded is not None or records):
+                merge(reloaded, records)
+            if self.pending:
+                for record in self.pending:
+                    self.sequence += 1
+                    record["seq"] = self.sequence
+                    if record["op"] == "add":
+                        record["entry"]["id"] = self.next_ids.get(record["collection"], 0)
+                        self.next_ids[record["collection"]] = record["entry"]["id"] + 1
+                payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self.pending).encode("utf-8")
+                if self._log_size() > self.log_offset:
+                    # Garbage after the last complete record (a writer crashed mid-append)
+                    os.truncate(self.log_path, self.log_offset)
+                with open(self.log_path, 'ab') as f:
+                    f.write(payload)
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                self.log_offset += len(payload)
+                self.log_records += len(self.pending)
+                self.pending = []
+                self._staged = {}
+            return self.log_records >= self.compact_every
+
+    def compact(self, data: Dict[str, Any]):
+        """
+        Write a new snapshot of data atomically and empty the journal; entries keep their ids
+        Args:
+            data: Full knowledge base, including every committed record; commit() must have run
+                under the same lock so no other process's records are missing
+        """
+        with self.locked():
+            if self.pending:
+                raise ValueError("Commit staged records before compacting")
+            for name, entries in data.items():
+                if isinstance(entries, list):
+                    self.next_ids[name] = max(self.next_ids.get(name, 0), self._max_id(entries) + 1)
+            directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".kb_")
+            try:
+                # mkstemp creates 0600 files: keep the snapshot's permissions (or the umask default)
+                try:
+                    mode = os.stat(self.snapshot_path).st_mode & 0o7777
+                except FileNotFoundError:
+                    mode = DEFAULT_FILE_MODE
+                os.fchmod(fd, mode)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(dict(data, **{SEQUENCE_KEY: self.sequence, NEXT_ID_KEY: self.next_ids}), f,
+                              ensure_ascii=False)
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                os.replace(temp_path, self.snapshot_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            if self.fsync:
+                _fsync_directory(directory)
+            # The snapshot now holds every record; a crash before this truncation is handled by the sequence check
+            open(self.log_path, 'w').close()
+            self.snapshot_sequence = self.sequence
+            self.snapshot_identity = self._snapshot_stat()
+            self.log_offset = self.log_records = 0
@@ -0,0 +1,10 @@
+"""
+QA Package for Virtual Software Company - Next Generation
+"""
+from .prioritization import TestHistory
+from .test_runner import ParallelTestRunner
+
+__all__ = [
+    'ParallelTestRunner',
+    'TestHistory'
+]
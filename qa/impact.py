@@ -0,0 +1,142 @@
+"""
+Test Impact Analysis - Next Generation
+Selects the tests affected by a code change from the project's module dependency graph
+"""
+import ast
+from collections import deque
+from pathlib import PurePosixPath
+from typing import Dict, Any, List, Optional, Set
+
+
+def module_names(path: str) -> List[str]:
+    """
+    Dotted module names a project file can be imported as
+    Args:
+        path: Project-relative path, e.g. "src/game/board.py"
+    Returns:
+        Names from the project root and, for src-style layouts, without the top folder
+    """
+    parts = list(PurePosixPath(path).with_suffix('').parts)
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    if not parts:
+        return []
+    names = [".".join(parts)]
+    if len(parts) > 1:
+        names.append(".".join(parts[1:]))
+    return names
+
+
+def _imported_names(path: str, source: str) -> Optional[Set[str]]:
+    """Dotted names a file imports, with relative imports resolved; None if it does not parse"""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    package_parts = list(PurePosixPath(path).parent.parts)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package_parts[:len(package_parts) - (node.level - 1)] if node.level > 1 else package_parts
+                prefix = ".".join(base + ([node.module] if node.module else []))
+            else:
+                prefix = node.module or ""
+            if prefix:
+                names.add(prefix)
+            # "from pkg import mod" may import a submodule rather than an attribute
+            names.update(f"{prefix}.{alias.name}" if prefix else alias.name for alias in node.names)
+    return names
+
+
+def build_dependency_graph(files: List[Dict[str, str]]) -> Optional[Dict[str, Set[str]]]:
+    """
+    Build file -> project files it imports (directly)
+    Args:
+        files: Project files, a list of {"path", "content"} dicts (code and tests)
+    Returns:
+        Adjacency mapping, or None when a Python file could not be parsed
+    """
+    index = {}
+    for file_info in files:
+        path = file_info.get('path', '')
+        if path.endswith('.py'):
+            for name in module_names(path):
+                index.setdefault(name, path)
+
+    graph = {}
+    for file_info in files:
+        path = file_info.get('path', '')
+        if not path.endswith('.py'):
+            continue
+        imported = _imported_names(path, file_info.get('content', ''))
+        if imported is None:
+            return None
+        edges = set()
+        for name in imported:
+            parts = name.split('.')
+            # Importing a.b.c also executes a/__init__ and a/b/__init__
+            for i in range(len(parts), 0, -1):
+                target = index.get(".".join(parts[:i]))
+                if target and target != path:
+                    edges.add(target)
+        graph[path] = edges
+    return graph
+
+
+def transitive_dependencies(graph: Dict[str, Set[str]], path: str) -> Set[str]:
+    """
+    Every project file a file imports, directly or indirectly
+    Args:
+        graph: Dependency graph from build_dependency_graph
+        path: File to start from
+    Returns:
+        Reachable files, excluding path itself
+    """
+    seen, queue = {path}, deque([path])
+    while queue:
+        for dependency in graph.get(queue.popleft(), ()):
+            if dependency not in seen:
+                seen.add(dependency)
+                queue.append(dependency)
+    seen.discard(path)
+    return seen
+
+
+def select_affected_tests(test_paths: List[str], changed_paths: Set[str],
+                          graph: Optional[Dict[str, Set[str]]],
+                          coverage: Optional[Dict[str, Set[str]]] = None) -> Dict[str, Any]:
+    """
+    Decide which test files must rerun after a change
+    Args:
+        test_paths: All test files of the suite
+        changed_paths: Project files added or modified since the last run
+        graph: Dependency graph from build_dependency_graph
+        coverage: Optional test file -> project files it executed in an earlier run
+    Returns:
+        {"mode": "incremental" | "full", "tests": [...], "reason": str}
+    """
+    if graph is None:
+        return {"mode": "full", "tests": list(test_paths), "reason": "dependency graph unavailable"}
+    non_python = sorted(p for p in changed_paths if not p.endswith('.py'))
+    if non_python:
+        # Data/config files can be read by anything; imports do not tell us who
+        return {"mode": "full", "tests": list(test_paths), "reason": f"non-Python change: {non_python[0]}"}
+    if any(PurePosixPath(p).name == "conftest.py" for p in changed_paths):
+        return {"mode": "full", "tests": list(test_paths), "reason": "conftest.py changed"}
+
+    selected = []
+    for test_path in test_paths:
+        if test_path in changed_paths:
+            selected.append(test_path)
+            continue
+        if coverage and changed_paths & coverage.get(test_path, set()):
+            selected.append(test_path)
+            continue
+        if changed_paths & transitive_dependencies(graph, test_path):
+            selected.append(test_path)
+
+    return {"mode": "incremental", "tests": selected, "reason": f"{len(changed_paths)} file(s) changed"}
@@ -0,0 +1,145 @@
+"""
+Test Prioritization - Next Generation
+Orders tests by historical failure probability and unique coverage so failures surface first
+"""
+from typing import Dict, Any, List, Set
+
+# How much unique coverage can add on top of the failure probability
+UNIQUE_COVERAGE_WEIGHT = 0.25
+
+
+class TestHistory:
+    """
+    Per-test pass/fail history of a workflow
+    """
+
+    # Not a test class, despite the name
+    __test__ = False
+
+    def __init__(self):
+        """Initialize an empty history"""
+        self.runs = {}
+        self.failures = {}
+        self.durations = {}
+
+    def record(self, tests: List[Dict[str, Any]]):
+        """
+        Add the outcomes of a run
+        Args:
+            tests: Per-test results; skipped tests are ignored
+        """
+        for test in tests:
+            if test["outcome"] == "skipped":
+                continue
+            nodeid = test["nodeid"]
+            self.runs[nodeid] = self.runs.get(nodeid, 0) + 1
+            if test["outcome"] == "failed":
+                self.failures[nodeid] = self.failures.get(nodeid, 0) + 1
+            self.durations[nodeid] = test.get("duration", 0.0)
+
+    def failure_probability(self, nodeid: str) -> float:
+        """
+        Smoothed failure rate of a test; tests without history get 0.5
+        Args:
+            nodeid: Test id as reported by the runner
+        Returns:
+            Probability between 0 and 1
+        """
+        return (self.failures.get(nodeid, 0) + 1) / (self.runs.get(nodeid, 0) + 2)
+
+
+def unique_coverage(coverage_tests: Dict[str, Dict[str, Any]], code_paths: Set[str]) -> Dict[str, float]:
+    """
+    Share of the covered project lines that only one test executes
+    Args:
+        coverage_tests: Test id -> {"lines": {path: [line, ...]}, ...}
+        code_paths: Project (non-test) files to count
+    Returns:
+        Test id -> unique lines / all covered lines
+    """
+    owners = {}
+    for nodeid, entry in coverage_tests.items():
+        for path, lines in entry.get("lines", {}).items():
+            if path in code_paths:
+                for line in lines:
+                    owners.setdefault((path, line), []).append(nodeid)
+
+    if not owners:
+        return {}
+    unique = {}
+    for tests in owners.values():
+        if len(tests) == 1:
+            unique[tests[0]] = unique.get(tests[0], 0) + 1
+    return {nodeid: count / len(owners) for nodeid, count in unique.items()}
+
+
+def prioritize(test_paths: List[str], known_tests: Dict[str, str], history: TestHistory,
+               coverage_tests: Dict[str, Dict[str, Any]], code_paths: Set[str]) -> Dict[str, Any]:
+    """
+    Score tests and order test files so likely failures run first
+    Args:
+        test_paths: Test files about to run
+        known_tests: Test id -> test file, for tests seen in earlier runs
+        history: Pass/fail history
+        coverage_tests: Per-test coverage of earlier runs
+        code_paths: Project (non-test) files
+    Returns:
+        {"scores": {test id: score}, "order": test files, highest priority first}
+    """
+    uniqueness = unique_coverage(coverage_tests, code_paths)
+    scores = {
+        nodeid: history.failure_probability(nodeid) + UNIQUE_COVERAGE_WEIGHT * uniqueness.get(nodeid, 0.0)
+        for nodeid, path in known_tests.items()
+        if path in test_paths
+    }
+
+    # A file ranks by its most urgent test; files without history (new tests) go first
+    file_scores = {}
+    for nodeid, score in scores.items():
+        path = known_tests[nodeid]
+        file_scores[path] = max(file_scores.get(path, 0.0), score)
+    unseen = [path for path in test_paths if path not in file_scores]
+    ranked = sorted(file_scores, key=lambda path: -file_scores[path])
+    return {"scores": scores, "order": unseen + ranked}
+
+
+def coverage_by_test_file(coverage_tests: Dict[str, Dict[str, Any]], known_tests: Dict[str, str]) -> Dict[str, Set[str]]:
+    """
+    Project files each test file executed, for coverage-aware impact analysis
+    Args:
+        coverage_tests: Per-test coverage
+        known_tests: Test id -> test file
+    Returns:
+        Test file -> executed files
+    """
+    files = {}
+    for nodeid, entry in coverage_tests.items():
+        path = known_tests.get(nodeid)
+        if path:
+            files.setdefault(path, set()).update(entry.get("lines", {}))
+    return files
+
+
+def summarize_coverage(coverage_tests: Dict[str, Dict[str, Any]], tool: str) -> Dict[str, Any]:
+    """
+    Coverage map stored in the workflow artifacts
+    Args:
+        coverage_tests: Per-test coverage
+        tool: "coverage.py" (lines and branches) or "settrace" (lines only)
+    Returns:
+        {"tool", "files": {path: {"lines", "arcs"}}, "tests": per-test coverage}
+    """
+    lines, arcs = {}, {}
+    for entry in coverage_tests.values():
+        for path, covered in entry.get("lines", {}).items():
+            lines.setdefault(path, set()).update(covered)
+        for path, covered in entry.get("arcs", {}).items():
+            arcs.setdefault(path, set()).update(tuple(arc) for arc in covered)
+    return {
+        "tool": tool,
+        "files": {
+            path: {"lines": sorted(covered), "arcs": sorted(arcs.get(path, ()))}
+            for path, covered in sorted(lines.items())
+        },
+        "tests": coverage_tests
+    }
@@ -0,0 +1,135 @@
+"""
+Test Result Cache - Next Generation
+Caches per-test outcomes keyed by the test file, the modules it depends on and the environment
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+DEFAULT_RESULT_CACHE = os.getenv(
+    "TEST_RESULT_CACHE_DIR",
+    str(Path.home() / ".cache" / "virtual_company" / "test_results")
+)
+
+
+def result_cache_key(test_digest: str, dependency_digests: Dict[str, str], environment_key: str) -> str:
+    """
+    Build the cache key of one test file
+    Args:
+        test_digest: Content digest of the test file
+        dependency_digests: Path -> content digest of every project file it (transitively) imports
+        environment_key: Digest of the environment fingerprint
+    Returns:
+        Hex key
+    """
+    payload = json.dumps([test_digest, sorted(dependency_digests.items()), environment_key])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TestResultCache:
+    """
+    On-disk cache of test outcomes shared by reruns, resumed workflows and parallel batches
+    """
+
+    # Not a test class, despite the name
+    __test__ = False
+
+    def __init__(self, cache_dir: str = DEFAULT_RESULT_CACHE, max_entries: int = 5000):
+        """
+        Initialize the cache
+        Args:
+            cache_dir: Directory holding one JSON file per cached test file
+            max_entries: Entries kept before the least recently used ones are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Look up the cached outcomes of a test file
+        Args:
+            key: Key from result_cache_key
+        Returns:
+            Per-test results, or None on a miss
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                tests = json.load(f)["tests"]
+            # mtime doubles as the LRU timestamp
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return tests
+
+    def put(self, key: str, tests: List[Dict[str, Any]]):
+        """
+        Store the outcomes of a test file
+        Args:
+            key: Key from result_cache_key
+            tests: Per-test results of that file
+        """
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"stored_at": time.time(), "tests": tests}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def evict(self) -> int:
+        """
+        Drop the least recently used entries above max_entries
+        Returns:
+            Number of evicted entries
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        entries.append((os.stat(path).st_mtime, path))
+                    except OSError:
+                        continue
+
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return 0
+        entries.sort()
+        for _, path in entries[:excess]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        with self._lock:
+            self.evictions += excess
+        return excess
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate statistics of this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _entry_path(self, key: str) -> str:
+        """Location of an entry"""
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
@@ -0,0 +1,306 @@
+"""
+Static Pre-Review - Next Generation
+Fast local checks on generated code, run before the TechLead spends an LLM review on it
+"""
+import ast
+import builtins
+import json
+import re
+import time
+from pathlib import PurePosixPath
+from typing import Dict, Any, List, Optional, Set
+
+from qa.impact import module_names
+
+# Calls generated code must not make: dotted name -> reason
+DEFAULT_FORBIDDEN_CALLS = {
+    "eval": "动态执行字符串代码",
+    "exec": "动态执行字符串代码",
+    "os.system": "通过 shell 执行命令",
+    "os.popen": "通过 shell 执行命令",
+    "pickle.loads": "反序列化不可信数据",
+    "marshal.loads": "反序列化不可信数据",
+}
+
+# Names every module can use without defining them
+IMPLICIT_NAMES = set(dir(builtins)) | {
+    "__file__", "__name__", "__doc__", "__spec__", "__loader__", "__package__",
+    "__builtins__", "__path__", "__annotations__", "__class__"
+}
+
+# Dotted references in interface definitions, e.g. "board.Board.move(x, y)"
+DOTTED_REFERENCE = re.compile(r"\b[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)+")
+
+
+def _issue(path: str, line: int, check: str, message: str) -> Dict[str, Any]:
+    """One finding"""
+    return {"path": path, "line": line, "check": check, "message": message}
+
+
+def _defined_names(nodes: List[ast.AST]) -> Set[str]:
+    """Every name bound anywhere in a module (scopes flattened, so lookups never give false alarms)"""
+    names = set()
+    for node in nodes:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update(alias.asname or alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif type(node).__name__ in ("MatchAs", "MatchStar", "TypeVar", "ParamSpec", "TypeVarTuple"):
+            if getattr(node, "name", None):
+                names.add(node.name)
+        elif type(node).__name__ == "MatchMapping" and getattr(node, "rest", None):
+            names.add(node.rest)
+    return names
+
+
+def _top_level_names(tree: ast.Module) -> Optional[Dict[str, ast.AST]]:
+    """Names a module exports (name -> defining node); None when it cannot be known statically"""
+    names = {}
+    pending = list(tree.body)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name == "__getattr__":
+                return None
+            names[node.name] = node
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == "*":
+                    return None
+                names[alias.asname or alias.name.split('.')[0]] = node
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                for name in ast.walk(target):
+                    if isinstance(name, ast.Name):
+                        names[name.id] = node
+        elif isinstance(node, (ast.If, ast.Try, ast.With, ast.For, ast.While)):
+            # Conditional definitions (try/except ImportError, if TYPE_CHECKING, ...)
+            for field in ("body", "orelse", "finalbody"):
+                pending.extend(getattr(node, field, []))
+            for handler in getattr(node, "handlers", []):
+                pending.extend(handler.body)
+    return names
+
+
+def _class_members(node: ast.ClassDef) -> Set[str]:
+    """Methods and class attributes of a class"""
+    members = set()
+    for item in node.body:
+        if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            members.add(item.name)
+        elif isinstance(item, (ast.Assign, ast.AnnAssign)):
+            targets = item.targets if isinstance(item, ast.Assign) else [item.target]
+            members.update(t.id for t in targets if isinstance(t, ast.Name))
+    # Instance attributes assigned in methods ("self.x = ...")
+    for sub in ast.walk(node):
+        if isinstance(sub, ast.Attribute) and isinstance(sub.ctx, ast.Store) \
+                and isinstance(sub.value, ast.Name) and sub.value.id == "self":
+            members.add(sub.attr)
+    return members
+
+
+def _dotted_name(node: ast.AST, aliases: Dict[str, str]) -> str:
+    """Dotted name of a call target with import aliases resolved, or "" for computed targets"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return ""
+    parts.append(aliases.get(node.id, node.id))
+    return ".".join(reversed(parts))
+
+
+def _absolute_module(path: str, node: ast.ImportFrom) -> str:
+    """Module an ImportFrom refers to, with relative imports resolved against the file's package"""
+    if not node.level:
+        return node.module or ""
+    package_parts = list(PurePosixPath(path).parent.parts)
+    base = package_parts[:len(package_parts) - (node.level - 1)] if node.level > 1 else package_parts
+    return ".".join(base + ([node.module] if node.module else []))
+
+
+class StaticReviewGate:
+    """
+    Compile, name, import, interface and forbidden-call checks over a generated project
+    """
+
+    def __init__(self, forbidden_calls: Dict[str, str] = None):
+        """
+        Initialize the gate
+        Args:
+            forbidden_calls: Dotted call name -> reason, defaults to DEFAULT_FORBIDDEN_CALLS
+        """
+        self.forbidden_calls = forbidden_calls if forbidden_calls is not None else DEFAULT_FORBIDDEN_CALLS
+
+    def review(self, code_files: List[Dict[str, str]], design: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Check every Python file of a project
+        Args:
+            code_files: List of {"path", "content"} dicts
+            design: Structured Architect output; its interfaces are checked against the code
+        Returns:
+            {"passed", "errors", "files", "seconds"}; any error is a hard failure
+        """
+        started = time.perf_counter()
+        python_files = [f for f in code_files if f.get('path', '').endswith('.py')]
+        trees, errors = {}, []
+        for file_info in python_files:
+            path = file_info.get('path', '')
+            try:
+                tree = ast.parse(file_info.get('content', ''), filename=path)
+                compile(tree, path, "exec")
+            except SyntaxError as e:
+                errors.append(_issue(path, e.lineno or 0, "syntax", f"语法错误: {e.msg}"))
+                continue
+            except ValueError as e:
+                errors.append(_issue(path, 0, "syntax", f"无法编译: {e}"))
+                continue
+            trees[path] = tree
+
+        index = {}
+        for file_info in python_files:
+            path = file_info.get('path', '')
+            names = module_names(path)
+            # The name without the top folder only applies to src layouts; elsewhere it would shadow real modules
+            for name in names if PurePosixPath(path).parts[0] == "src" else names[:1]:
+                index.setdefault(name, path)
+        # Files that failed to parse export nothing we can check
+        exports = {path: _top_level_names(trees[path]) if path in trees else None for path in index.values()}
+        # Top-level names under which project modules live, to tell project imports from third-party ones
+        project_roots = {name.split('.')[0] for name in index}
+
+        for path, tree in trees.items():
+            # One traversal per file shared by all checks
+            nodes = list(ast.walk(tree))
+            errors.extend(self._check_names(path, nodes))
+            errors.extend(self._check_imports(path, nodes, index, exports, project_roots))
+            errors.extend(self._check_calls(path, nodes))
+        errors.extend(self._check_interfaces((design or {}).get('interfaces', []), trees, index, exports))
+
+        return {
+            "passed": not errors,
+            "errors": errors,
+            "files": len(python_files),
+            "seconds": round(time.perf_counter() - started, 4)
+        }
+
+    def _check_names(self, path: str, nodes: List[ast.AST]) -> List[Dict[str, Any]]:
+        """Names that are read but never bound, imported or built in"""
+        if any(isinstance(node, ast.ImportFrom) and any(a.name == "*" for a in node.names) for node in nodes):
+            # A star import can bind anything
+            return []
+        known = _defined_names(nodes) | IMPLICIT_NAMES
+        issues, reported = [], set()
+        for node in nodes:
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) \
+                    and node.id not in known and node.id not in reported:
+                reported.add(node.id)
+                issues.append(_issue(path, node.lineno, "undefined-name", f"未定义的名称: {node.id}"))
+        return issues
+
+    def _check_imports(self, path: str, nodes: List[ast.AST], index: Dict[str, str],
+                       exports: Dict[str, Optional[dict]], project_roots: Set[str]) -> List[Dict[str, Any]]:
+        """Imports of project modules or names that do not exist"""
+        issues = []
+        for node in nodes:
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name.split('.')[0] in project_roots and alias.name not in index:
+                        issues.append(_issue(path, node.lineno, "missing-import", f"项目中不存在模块: {alias.name}"))
+            elif isinstance(node, ast.ImportFrom):
+                module = _absolute_module(path, node)
+                if module not in index:
+                    if node.level or module.split('.')[0] in project_roots:
+                        issues.append(_issue(path, node.lineno, "missing-import", f"项目中不存在模块: {module or '.'}"))
+                    continue
+                names = exports.get(index[module])
+                if names is None:
+                    continue
+                for alias in node.names:
+                    if alias.name != "*" and alias.name not in names and f"{module}.{alias.name}" not in index:
+                        issues.append(_issue(path, node.lineno, "missing-import",
+                                             f"无法从 {module} 导入 {alias.name}"))
+        return issues
+
+    def _check_calls(self, path: str, nodes: List[ast.AST]) -> List[Dict[str, Any]]:
+        """Calls to forbidden functions and shell=True subprocesses"""
+        aliases = {}
+        for node in nodes:
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.asname:
+                        aliases[alias.asname] = alias.name
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                for alias in node.names:
+                    aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+
+        issues = []
+        for node in nodes:
+            if not isinstance(node, ast.Call):
+                continue
+            name = _dotted_name(node.func, aliases)
+            if name in self.forbidden_calls:
+                issues.append(_issue(path, node.lineno, "forbidden-call",
+                                     f"禁止调用 {name}: {self.forbidden_calls[name]}"))
+            elif name.startswith("subprocess.") and any(
+                    k.arg == "shell" and isinstance(k.value, ast.Constant) and k.value.value is True
+                    for k in node.keywords):
+                issues.append(_issue(path, node.lineno, "forbidden-call", f"禁止调用 {name}(shell=True): 通过 shell 执行命令"))
+        return issues
+
+    def _check_interfaces(self, interfaces: list, trees: Dict[str, ast.Module], index: Dict[str, str],
+                          exports: Dict[str, Optional[dict]]) -> List[Dict[str, Any]]:
+        """Interfaces from the design that name a project module but are not defined there"""
+        issues, seen = [], set()
+        for interface in interfaces or []:
+            text = interface if isinstance(interface, str) else json.dumps(interface, ensure_ascii=False)
+            for reference in DOTTED_REFERENCE.findall(text):
+                parts = reference.split('.')
+                if parts[-1] == "py" or reference in seen:
+                    continue
+                seen.add(reference)
+                # Longest prefix that is a project module, e.g. "game.board" in "game.board.Board.move"
+                for i in range(len(parts) - 1, 0, -1):
+                    module = ".".join(parts[:i])
+                    if module in index:
+                        break
+                else:
+                    continue
+
+                path = index[module]
+                names = exports.get(path)
+                if names is None:
+                    continue
+                member = parts[i]
+                if member not in names and f"{module}.{member}" not in index:
+                    issues.append(_issue(path, 0, "interface", f"设计接口 {reference} 未实现: {module} 中缺少 {member}"))
+                elif len(parts) > i + 1 and isinstance(names.get(member), ast.ClassDef) \
+                        and parts[i + 1] not in _class_members(names[member]):
+                    issues.append(_issue(path, names[member].lineno, "interface",
+                                         f"设计接口 {reference} 未实现: {member} 中缺少 {parts[i + 1]}"))
+        return issues
+
+
+def format_issues(issues: List[Dict[str, Any]], limit: int = 30) -> str:
+    """
+    Render findings as feedback for the Coder
+    Args:
+        issues: Findings from StaticReviewGate.review
+        limit: Maximum number of findings to list
+    Returns:
+        One finding per line
+    """
+    lines = [f"{i['path']}:{i['line']} [{i['check']}] {i['message']}" for i in issues[:limit]]
+    if len(issues) > limit:
+        lines.append(f"...以及另外 {len(issues) - limit} 个问题")
+    return "\n".join(lines)
@@ -0,0 +1,474 @@
+"""
+Parallel Test Runner - Next Generation
+Runs generated pytest suites in a sandbox directory, sharded across worker processes
+"""
+import os
+import shutil
+import json
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+from rich.console import Console
+from sandbox.content_store import ContentStore
+
+console = Console()
+
+TIMEOUT_PLUGIN_NAME = "_qa_timeout_plugin"
+
+# pytest plugin written into the sandbox: fails a single test once it runs longer than QA_TEST_TIMEOUT
+TIMEOUT_PLUGIN_SOURCE = '''
+import os
+import signal
+
+import pytest
+
+TIMEOUT = float(os.environ.get("QA_TEST_TIMEOUT", "30"))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    def _on_timeout(signum, frame):
+        pytest.fail(f"Test exceeded {TIMEOUT}s timeout", pytrace=False)
+
+    previous = signal.signal(signal.SIGALRM, _on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, TIMEOUT)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+'''
+
+COVERAGE_PLUGIN_NAME = "_qa_coverage_plugin"
+
+# pytest plugin written into the sandbox: runs tests in the order QA_TEST_PRIORITY asks for and
+# records which project lines (and, with coverage.py, branches) each test executes
+COVERAGE_PLUGIN_SOURCE = '''
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+try:
+    import coverage
+except ImportError:
+    coverage = None
+
+ROOT = os.path.realpath(os.environ.get("QA_COVERAGE_ROOT", os.getcwd()))
+
+
+def _test_id(nodeid):
+    # Same id the junit report uses: dotted module path (plus class) and test name
+    names = nodeid.split("::")
+    names[0] = names[0].replace("/", ".")
+    if names[0].endswith(".py"):
+        names[0] = names[0][:-3]
+    return ".".join(names[:-1]) + "::" + names[-1]
+
+
+def _relative(filename):
+    # Frozen and exec'd code ("<frozen os>", "<string>") has no file on disk
+    if not os.path.isabs(filename):
+        return None
+    filename = os.path.realpath(filename)
+    if not filename.startswith(ROOT + os.sep):
+        return None
+    relative = os.path.relpath(filename, ROOT).replace(os.sep, "/")
+    return None if relative.startswith("_qa_") else relative
+
+
+class _CoveragePyTracer:
+    tool = "coverage.py"
+
+    def __init__(self):
+        self.cov = coverage.Coverage(data_file=None, branch=True, include=[ROOT + "/*"], config_file=False)
+
+    def start(self, test_id):
+        self.cov.start()
+        self.cov.switch_context(test_id)
+
+    def stop(self):
+        self.cov.stop()
+
+    def results(self):
+        data = self.cov.get_data()
+        results = {}
+        for context in data.measured_contexts():
+            if not context:
+                continue
+            data.set_query_context(context)
+            entry = results.setdefault(context, {"lines": {}, "arcs": {}})
+            for filename in data.measured_files():
+                relative = _relative(filename)
+                lines = data.lines(filename) if relative else None
+                if lines:
+                    entry["lines"][relative] = sorted(lines)
+                    entry["arcs"][relative] = sorted(data.arcs(filename) or [])
+        return results
+
+
+class _LineTracer:
+    tool = "settrace"
+
+    def __init__(self):
+        self.relative_paths = {}
+        self.current = None
+        self.test_id = None
+        self.collected = {}
+
+    def _trace(self, frame, event, arg):
+        filename = frame.f_code.co_filename
+        if filename not in self.relative_paths:
+            self.relative_paths[filename] = _relative(filename)
+        relative = self.relative_paths[filename]
+        if relative is None:
+            return None
+        lines = self.current.setdefault(relative, set())
+        lines.add(frame.f_lineno)
+
+        def _trace_lines(frame, event, arg):
+            if event == "line":
+                lines.add(frame.f_lineno)
+            return _trace_lines
+        return _trace_lines
+
+    def start(self, test_id):
+        self.current, self.test_id = {}, test_id
+        threading.settrace(self._trace)
+        sys.settrace(self._trace)
+
+    def stop(self):
+        sys.settrace(None)
+        threading.settrace(None)
+        self.collected[self.test_id] = {
+            "lines": {path: sorted(lines) for path, lines in self.current.items()},
+            "arcs": {}
+        }
+
+    def results(self):
+        return self.collected
+
+
+_tracer = None
+
+
+def pytest_configure(config):
+    global _tracer
+    if os.environ.get("QA_COVERAGE_FILE"):
+        _tracer = _CoveragePyTracer() if coverage is not None else _LineTracer()
+
+
+def pytest_collection_modifyitems(session, config, items):
+    priority_file = os.environ.get("QA_TEST_PRIORITY")
+    if not priority_file:
+        return
+    with open(priority_file, "r", encoding="utf-8") as f:
+        priority = json.load(f)
+    scores, default = priority.get("scores", {}), priority.get("default", 0.0)
+    items.sort(key=lambda item: -scores.get(_test_id(item.nodeid), default))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    if _tracer is None:
+        yield
+        return
+    _tracer.start(_test_id(item.nodeid))
+    try:
+        yield
+    finally:
+        _tracer.stop()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if _tracer is None:
+        return
+    with open(os.environ["QA_COVERAGE_FILE"], "w", encoding="utf-8") as f:
+        json.dump({"tool": _tracer.tool, "tests": _tracer.results()}, f)
+'''
+
+
+def parse_junit_xml(xml_path: str) -> List[Dict[str, Any]]:
+    """
+    Parse a junit XML report into per-test results
+    Args:
+        xml_path: Report written by pytest --junitxml
+    Returns:
+        List of {"nodeid", "file", "name", "outcome", "duration", "message"} dicts
+    """
+    tests = []
+    root = ET.parse(xml_path).getroot()
+    for case in root.iter("testcase"):
+        classname = case.get("classname", "")
+        name = case.get("name", "")
+        outcome, message = "passed", ""
+        for child in case:
+            if child.tag in ("failure", "error"):
+                outcome = "failed"
+                message = child.get("message", "") or (child.text or "")[:500]
+                break
+            if child.tag == "skipped":
+                outcome = "skipped"
+                message = child.get("message", "")
+                break
+        tests.append({
+            "nodeid": f"{classname}::{name}" if classname else name,
+            "file": case.get("file", ""),
+            "name": name,
+            "outcome": outcome,
+            "duration": float(case.get("time", 0) or 0),
+            "message": message
+        })
+    return tests
+
+
+class ParallelTestRunner:
+    """
+    Shards test files across pytest worker processes and merges their junit reports
+    """
+
+    def __init__(self, workers: int = None, per_test_timeout: float = 30, shard_timeout: float = 600,
+                 collect_coverage: bool = True):
+        """
+        Initialize the runner
+        Args:
+            workers: Maximum number of concurrent pytest processes, defaults to the CPU count
+            per_test_timeout: Seconds a single test may run before it is failed
+            shard_timeout: Seconds a whole shard may run before its process group is killed
+            collect_coverage: Record per-test line (and with coverage.py, branch) coverage
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.per_test_timeout = per_test_timeout
+        self.shard_timeout = shard_timeout
+        self.collect_coverage = collect_coverage
+        self.content_store = ContentStore()
+
+    def run(self, code_files: List[Dict[str, str]], test_files: List[Dict[str, str]],
+            python: str = sys.executable, selected_paths: List[str] = None,
+            priorities: Dict[str, float] = None, fail_fast: bool = False) -> Dict[str, Any]:
+        """
+        Materialize code and tests into a sandbox and run the tests in parallel shards
+        Args:
+            code_files: Coder output, a list of {"path", "content"} dicts
+            test_files: QA output, a list of {"path", "content"} dicts
+            python: Interpreter of the workflow's sandbox
+            selected_paths: Only run these test files, highest priority first
+                (all test files are still materialized)
+            priorities: Test id -> score; within a shard higher scores run first
+            fail_fast: Stop every shard as soon as one test fails
+        Returns:
+            Aggregated test results with per-test durations and coverage
+        """
+        test_paths = [f.get('path', '') for f in test_files if f.get('path', '').endswith('.py')]
+        if selected_paths is not None:
+            test_paths = [p for p in selected_paths if p in test_paths]
+        if not test_paths:
+            return self.summarize([], [], 0.0, "没有可执行的测试文件")
+
+        sandbox_dir = tempfile.mkdtemp(prefix="sandbox_qa_")
+        started = time.perf_counter()
+        stop = threading.Event() if fail_fast else None
+        try:
+            self.content_store.materialize(code_files + test_files, sandbox_dir)
+            for name, source in ((TIMEOUT_PLUGIN_NAME, TIMEOUT_PLUGIN_SOURCE),
+                                 (COVERAGE_PLUGIN_NAME, COVERAGE_PLUGIN_SOURCE)):
+                with open(os.path.join(sandbox_dir, name + ".py"), 'w', encoding='utf-8') as f:
+                    f.write(source)
+            if priorities:
+                with open(os.path.join(sandbox_dir, ".priority.json"), 'w', encoding='utf-8') as f:
+                    json.dump({"scores": priorities, "default": max(priorities.values())}, f)
+
+            shards = self._shard(test_files, test_paths)
+            with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+                shard_results = list(pool.map(
+                    lambda item: self._run_shard(item[0], item[1], sandbox_dir, python, stop),
+                    enumerate(shards)
+                ))
+        finally:
+            shutil.rmtree(sandbox_dir, ignore_errors=True)
+
+        tests = [test for shard in shard_results for test in shard["tests"]]
+        errors = [shard["error"] for shard in shard_results if shard.get("error")]
+        results = self.summarize(tests, errors, time.perf_counter() - started, "", len(shards))
+        results["coverage"] = self._merge_coverage(shard_results)
+        results["stopped_early"] = bool(stop and stop.is_set())
+        return results
+
+    def _shard(self, test_files: List[Dict[str, str]], test_paths: List[str]) -> List[List[str]]:
+        """Split test files into size-balanced shards, each keeping the priority order of test_paths"""
+        sizes = {f.get('path', ''): len(f.get('content', '')) for f in test_files}
+        shard_count = min(self.workers, len(test_paths))
+        shards = [[] for _ in range(shard_count)]
+        loads = [0] * shard_count
+        for path in sorted(test_paths, key=lambda p: sizes.get(p, 0), reverse=True):
+            target = loads.index(min(loads))
+            shards[target].append(path)
+            loads[target] += sizes.get(path, 0)
+        rank = {path: i for i, path in enumerate(test_paths)}
+        return [sorted(shard, key=rank.get) for shard in shards]
+
+    def _run_shard(self, index: int, paths: List[str], sandbox_dir: str, python: str,
+                   stop: threading.Event = None) -> Dict[str, Any]:
+        """Run one pytest process over a shard of test files"""
+        xml_path = os.path.join(sandbox_dir, f".junit_shard_{index}.xml")
+        coverage_path = os.path.join(sandbox_dir, f".coverage_shard_{index}.json")
+        priority_path = os.path.join(sandbox_dir, ".priority.json")
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [sandbox_dir, env.get("PYTHONPATH")]))
+        env["QA_TEST_TIMEOUT"] = str(self.per_test_timeout)
+        env["QA_COVERAGE_ROOT"] = sandbox_dir
+        if self.collect_coverage:
+            env["QA_COVERAGE_FILE"] = coverage_path
+        if os.path.exists(priority_path):
+            env["QA_TEST_PRIORITY"] = priority_path
+        command = [
+            python, "-m", "pytest", "-q",
+            "-p", "no:cacheprovider",
+            "-p", TIMEOUT_PLUGIN_NAME,
+            "-p", COVERAGE_PLUGIN_NAME,
+            f"--junitxml={xml_path}",
+            "-o", "junit_family=xunit2",
+            "--continue-on-collection-errors",
+        ] + (["-x"] if stop is not None else []) + paths
+
+        # Output goes to a file so the process can be polled without draining a pipe
+        with tempfile.TemporaryFile() as output_file:
+            process = subprocess.Popen(
+                command,
+                cwd=sandbox_dir,
+                env=env,
+                stdout=output_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+            outcome = self._wait(process, stop)
+            output_file.seek(0)
+            output = output_file.read()
+
+        tests = self._read_report(xml_path)
+        self._attach_files(tests, paths)
+        coverage = self._read_coverage(coverage_path)
+        if stop is not None and any(t["outcome"] == "failed" for t in tests):
+            stop.set()
+        if outcome == "timeout":
+            return {"tests": tests, "coverage": coverage, "error": f"shard {index} timed out: {', '.join(paths)}"}
+        if outcome == "stopped":
+            return {"tests": tests, "coverage": coverage}
+
+        # Exit code 5 means "no tests collected"; anything else without a report is a crash
+        if not tests and process.returncode not in (0, 5):
+            tail = output.decode('utf-8', errors='replace')[-1000:]
+            if stop is not None:
+                stop.set()
+            return {"tests": [], "coverage": coverage, "error": f"shard {index} failed (exit {process.returncode}): {tail}"}
+        return {"tests": tests, "coverage": coverage}
+
+    def _wait(self, process: subprocess.Popen, stop: threading.Event = None) -> str:
+        """
+        Wait for a shard, stopping it when its timeout expires or another shard failed under fail-fast
+        Returns:
+            "finished", "stopped" or "timeout"
+        """
+        deadline = time.monotonic() + self.shard_timeout
+        while True:
+            try:
+                process.wait(timeout=0.1)
+                return "finished"
+            except subprocess.TimeoutExpired:
+                pass
+            if stop is not None and stop.is_set():
+                # SIGINT lets pytest finish its junit report for the tests that already ran
+                os.killpg(process.pid, signal.SIGINT)
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+                return "stopped"
+            if time.monotonic() > deadline:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+                return "timeout"
+
+    def _attach_files(self, tests: List[Dict[str, Any]], paths: List[str]):
+        """Fill in each test's file from its dotted classname (xunit2 omits the file attribute)"""
+        modules = sorted(((p[:-3].replace('/', '.'), p) for p in paths), key=lambda m: len(m[0]), reverse=True)
+        for test in tests:
+            if test["file"]:
+                continue
+            dotted = test["nodeid"].split("::")[0]
+            for module, path in modules:
+                if dotted == module or dotted.startswith(module + "."):
+                    test["file"] = path
+                    break
+
+    def _read_report(self, xml_path: str) -> List[Dict[str, Any]]:
+        """Parse a shard report if pytest got far enough to write one"""
+        if not os.path.exists(xml_path):
+            return []
+        try:
+            return parse_junit_xml(xml_path)
+        except ET.ParseError:
+            return []
+
+    def _read_coverage(self, coverage_path: str) -> Dict[str, Any]:
+        """Load the per-test coverage a shard's plugin wrote, if any"""
+        if not os.path.exists(coverage_path):
+            return {}
+        try:
+            with open(coverage_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _merge_coverage(self, shard_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combine the shards' coverage into {"tool", "tests": {test id: {"lines", "arcs"}}}"""
+        merged = {"tool": "", "tests": {}}
+        for shard in shard_results:
+            coverage = shard.get("coverage") or {}
+            merged["tool"] = merged["tool"] or coverage.get("tool", "")
+            merged["tests"].update(coverage.get("tests", {}))
+        return merged
+
+    def summarize(self, tests: List[Dict[str, Any]], errors: List[str], duration: float,
+                  details: str, shard_count: int = 0) -> Dict[str, Any]:
+        """
+        Build the execute_tests result dict
+        Args:
+            tests: Per-test results
+            errors: Shard-level errors, each counted as one failure
+            duration: Wall-clock seconds of the run
+            details: Summary text; built from the failures when empty
+            shard_count: Number of pytest processes used
+        Returns:
+            Aggregated results; a run without any test is not a success and is flagged "no_tests"
+        """
+        passed = sum(1 for t in tests if t["outcome"] == "passed")
+        failed = sum(1 for t in tests if t["outcome"] == "failed") + len(errors)
+        skipped = sum(1 for t in tests if t["outcome"] == "skipped")
+        no_tests = not tests and not errors
+        if not details:
+            failures = [f"{t['nodeid']}: {t['message']}" for t in tests if t["outcome"] == "failed"]
+            details = "\n".join(failures + errors) or ("没有收集到任何测试" if no_tests else "所有测试通过")
+        return {
+            "success": not no_tests,
+            "no_tests": no_tests,
+            "passed": passed,
+            "failed": failed,
+            "skipped": skipped,
+            "total": passed + failed + skipped,
+            "details": details,
+            "tests": tests,
+            "errors": errors,
+            "duration": round(duration, 3),
+            "shards": shard_count
+        }
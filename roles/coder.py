@@ -3,33 +3,62 @@ Coder Role - Next Generation
 """
 import json
 import os
-from typing import Dict, Any
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
 from config import WORKER_CONFIG
 from utils import clean_json_text, call_llm, load_prompt, safe_json_parse
 from rich.console import Console
+from workspace.virtual import VirtualWorkspace
 
 console = Console()
 
+# Fallback prompt for generating a single file of a planned project
+FILE_PROMPT_FALLBACK = (
+    "你是软件工程师。请只实现文件 {file_path}（{file_description}）。"
+    "项目文件结构：{file_structure}。共享接口定义：{interfaces}。任务描述：{task_description}。"
+    "返回包含 path 和 content 的JSON。"
+)
+
 class Coder:
-    def __init__(self, model_name="gemini-1.5-pro"):
+    def __init__(self, model_name="gemini-1.5-pro", workspace: VirtualWorkspace = None,
+                 parallel_files: bool = True, max_parallel_files: int = 8, interface_context_limit: int = 4000):
         """
         Initialize Coder role
         Args:
             model_name: Model name, defaults to "gemini-1.5-pro"
+            workspace: Workflow workspace generated files are saved to
+            parallel_files: Generate each file of the Architect's file_structure in its own concurrent request
+            max_parallel_files: Maximum concurrent per-file requests
+            interface_context_limit: Characters of interface definitions shared with each per-file request
         """
         self.model_name = model_name
         self.coder_config = WORKER_CONFIG
+        self.workspace = workspace or VirtualWorkspace()
+        self.last_changes = {}
+        self.parallel_files = parallel_files
+        self.max_parallel_files = max_parallel_files
+        self.interface_context_limit = interface_context_limit
 
-    def implement_code(self, design_document: str, task_description: str) -> Dict[str, Any]:
+    def implement_code(self, design_document: str, task_description: str, design: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Implement code based on design document
         Args:
             design_document: System design document
             task_description: Specific task description
+            design: Structured Architect output; its file_structure enables per-file generation
         Returns:
             Implementation result with code files
         """
         console.print("[bold blue]Coder 正在实现代码...[/bold blue]")
+
+        planned_files = self._planned_files(design or {})
+        if self.coder_config['client'] and self.parallel_files and len(planned_files) > 1:
+            result = self._implement_per_file(planned_files, design, task_description)
+            if result['success']:
+                return result
+            console.print(f"[yellow]逐文件生成失败 ({result['error']})，回退到整体生成[/yellow]")
         
         # Load the coder prompt
         try:
@@ -39,7 +68,7 @@ class Coder:
                 prompt_template = prompts['implementation_task']
         except:
             # Fallback prompt if file not found
-            prompt_template = "你是软件工程师。请根据以下设计文档实现代码：{design_document}，任务描述：{task_description}。返回包含代码文件的JSON。"
+            prompt_template = "你是软件工程师。请根据以下设计文档实现代码：{design_document}，任务描述：{task_description}。返回包含代码文件(files)和入口文件(entry_point)的JSON。"
         
         prompt = prompt_template.format(
             design_document=design_document,
@@ -61,7 +90,9 @@ class Coder:
             return {
                 "success": True,
                 "code_files": code_data.get('files', []),
+                "entry_point": code_data.get('entry_point', ''),
                 "files_created": files_created,
+                "workspace_changes": self.last_changes,
                 "raw_output": code_output
             }
         else:
@@ -69,32 +100,141 @@ class Coder:
             return {
                 "success": False,
                 "code_files": [],
+                "entry_point": "",
                 "files_created": [],
                 "raw_output": "",
                 "error": "Coder AI 未初始化"
             }
 
+    def _planned_files(self, design: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Files listed in the Architect's file_structure
+        Args:
+            design: Structured Architect output
+        Returns:
+            List of {"path", "description"} dicts; directories and entries without a file name are dropped
+        """
+        planned, seen = [], set()
+        for entry in design.get('file_structure', []) or []:
+            if isinstance(entry, dict):
+                path = str(entry.get('path') or entry.get('file') or entry.get('name') or '')
+                description = str(entry.get('description') or entry.get('purpose') or '')
+            else:
+                # Entries like "src/game.py - game loop" or "main.py：入口"
+                parts = re.split(r'\s+[-—:：]\s*|[:：]\s*|\s+', str(entry).strip(), maxsplit=1)
+                path = parts[0].strip('`*- ')
+                description = parts[1].strip() if len(parts) > 1 else ''
+            if not path or path.endswith('/') or '.' not in os.path.basename(path) or path in seen:
+                continue
+            seen.add(path)
+            planned.append({"path": path, "description": description})
+        return planned
+
+    def _interface_context(self, interfaces: list, file_path: str) -> str:
+        """
+        Interface definitions shared with one per-file request, capped at interface_context_limit
+        Args:
+            interfaces: Architect interface definitions
+            file_path: File being generated; interfaces mentioning it come first
+        Returns:
+            Interface text
+        """
+        module = os.path.splitext(os.path.basename(file_path))[0]
+        texts = [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in interfaces or []]
+        texts.sort(key=lambda text: file_path not in text and module not in text)
+
+        selected, used = [], 0
+        for text in texts:
+            if used + len(text) > self.interface_context_limit:
+                break
+            selected.append(text)
+            used += len(text) + 1
+        omitted = len(texts) - len(selected)
+        if omitted:
+            selected.append(f"...(已省略 {omitted} 项接口定义)")
+        return "\n".join(selected)
+
+    def _implement_per_file(self, planned_files: List[Dict[str, str]], design: Dict[str, Any],
+                            task_description: str) -> Dict[str, Any]:
+        """
+        Generate every planned file in its own concurrent request and assemble the project
+        Args:
+            planned_files: Files from _planned_files
+            design: Structured Architect output
+            task_description: Specific task description
+        Returns:
+            Implementation result in the same shape as implement_code
+        """
+        started = time.perf_counter()
+        try:
+            prompt_template = load_prompt("roles/prompts/coder.yaml")['file_implementation_task']
+        except Exception:
+            prompt_template = FILE_PROMPT_FALLBACK
+        file_structure = ", ".join(f['path'] for f in planned_files)
+
+        def generate(planned: Dict[str, str]) -> Dict[str, str]:
+            prompt = prompt_template.format(
+                file_path=planned['path'],
+                file_description=planned['description'] or 'N/A',
+                file_structure=file_structure,
+                interfaces=self._interface_context(design.get('interfaces', []), planned['path']),
+                task_description=task_description
+            )
+            raw_response = call_llm(self.coder_config, prompt)
+            file_data = safe_json_parse(clean_json_text(raw_response), {})
+            content = file_data.get('content') if isinstance(file_data, dict) else None
+            if not isinstance(content, str):
+                # Plain code answer instead of JSON: keep it without markdown fences
+                content = re.sub(r'^```[\w+-]*\s*\n|\n?```\s*$', '', raw_response.strip())
+            if not content.strip():
+                raise ValueError(f"empty content for {planned['path']}")
+            return {"path": planned['path'], "content": content}
+
+        console.print(f"[cyan]按文件并行生成 {len(planned_files)} 个文件...[/cyan]")
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_files, len(planned_files))) as pool:
+            futures = [pool.submit(generate, planned) for planned in planned_files]
+        files, errors = [], []
+        for planned, future in zip(planned_files, futures):
+            try:
+                files.append(future.result())
+            except Exception as e:
+                errors.append(f"{planned['path']}: {e}")
+        if errors:
+            return {"success": False, "error": "; ".join(errors)}
+
+        paths = [f['path'] for f in files]
+        entry_point = design.get('entry_point') or next(
+            (p for p in paths if os.path.basename(p) in ("main.py", "app.py", "run.py")), "")
+        console.print("[bold green]代码实现完成！[/bold green]")
+        files_created = self.save_code_files(files)
+        return {
+            "success": True,
+            "code_files": files,
+            "entry_point": entry_point,
+            "files_created": files_created,
+            "workspace_changes": self.last_changes,
+            "raw_output": json.dumps({"files": files, "entry_point": entry_point}, ensure_ascii=False),
+            "generation": {
+                "mode": "per_file",
+                "files": len(files),
+                "seconds": round(time.perf_counter() - started, 3)
+            }
+        }
+
     def save_code_files(self, files_data: list) -> list:
         """
-        Save code files to disk
+        Save code files to the workflow workspace
         Args:
             files_data: List of file dictionaries with path and content
         Returns:
-            List of created file paths
+            List of code file paths in the workspace
         """
-        created_files = []
-        for file_info in files_data:
-            file_path = file_info.get('path', '')
-            content = file_info.get('content', '')
-            
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # Write file content
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            created_files.append(file_path)
-            console.print(f"[green]创建文件: {file_path}[/green]")
-        
-        return created_files
\ No newline at end of file
+        # Regenerated output replaces the previous iteration's files; disk is only touched on flush
+        changes = self.workspace.write_files(files_data, kind="code", replace=True)
+        self.last_changes = changes
+        for path in changes["added"] + changes["modified"]:
+            console.print(f"[green]创建文件: {path}[/green]")
+        for path in changes["rejected"]:
+            console.print(f"[red]写入文件失败: {path} (不安全的路径)[/red]")
+
+        return self.workspace.paths("code")
\ No newline at end of file
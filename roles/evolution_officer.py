@@ -104,20 +104,22 @@ class EvolutionOfficer:
         # Extract error-solution pairs from insights
         error_solution_pairs = insights.get('analysis', {}).get('error_solution_pairs', [])
         
-        for pair in error_solution_pairs:
-            error = pair.get('error', '')
-            solution = pair.get('solution', '')
-            context = pair.get('context', '') or project_context
+        # One durable write for the whole analysis
+        with evolutionary_memory.batch():
+            for pair in error_solution_pairs:
+                error = pair.get('error', '')
+                solution = pair.get('solution', '')
+                context = pair.get('context', '') or project_context
             
-            # Add to evolutionary memory
-            evolutionary_memory.add_error_solution_pair(error, solution, context)
-        
-        # Also store other types of insights
-        other_insights = insights.get('analysis', {}).get('other_insights', [])
-        for insight in other_insights:
-            description = insight.get('description', '')
-            solution = insight.get('solution', '')
-            evolutionary_memory.add_solution(solution, description)
+                # Add to evolutionary memory
+                evolutionary_memory.add_error_solution_pair(error, solution, context)
+        
+            # Also store other types of insights
+            other_insights = insights.get('analysis', {}).get('other_insights', [])
+            for insight in other_insights:
+                description = insight.get('description', '')
+                solution = insight.get('solution', '')
+                evolutionary_memory.add_solution(solution, description)
         
         console.print("[bold green]洞察已成功存储到知识库！[/bold green]")
     
@@ -3,10 +3,18 @@ QA Engineer Role - Next Generation
 """
 import json
 import os
-from typing import Dict, Any
+import sys
+from typing import Dict, Any, Optional
 from config import WORKER_CONFIG
 from utils import clean_json_text, call_llm, load_prompt, safe_json_parse
 from rich.console import Console
+from workspace.virtual import VirtualWorkspace
+from qa.impact import build_dependency_graph, select_affected_tests, transitive_dependencies
+from qa.prioritization import TestHistory, coverage_by_test_file, prioritize, summarize_coverage
+from qa.result_cache import TestResultCache, result_cache_key
+from qa.test_runner import ParallelTestRunner
+from sandbox.content_store import content_digest
+from sandbox.environment import fingerprint_digest, get_environment_fingerprint
 
 console = Console()
 
@@ -15,14 +23,27 @@ class QAEngineer:
     QA Engineer Role - responsible for creating test cases and performing quality assurance
     """
     
-    def __init__(self, model_name="gemini-1.5-pro"):
+    def __init__(self, model_name="gemini-1.5-pro", workspace: VirtualWorkspace = None):
         """
         Initialize QA Engineer role
         Args:
             model_name: Model name, defaults to "gemini-1.5-pro"
+            workspace: Workflow workspace generated files are saved to
         """
         self.model_name = model_name
         self.qa_config = WORKER_CONFIG
+        self.workspace = workspace or VirtualWorkspace()
+        self.last_changes = {}
+        self.test_runner = ParallelTestRunner()
+        self.result_cache = TestResultCache()
+        # Inputs and per-test outcomes of the previous run, for test impact analysis
+        self.last_snapshot = {}
+        self.last_test_results = {}
+        # Pass/fail history and per-test coverage, for ordering likely failures first
+        self.history = TestHistory()
+        self.coverage_tests = {}
+        self.coverage_tool = ""
+        self.last_priorities = {}
 
     def create_test_cases(self, design_document: str, implementation_code: str, task_description: str) -> Dict[str, Any]:
         """
@@ -70,6 +91,7 @@ class QAEngineer:
                 "test_strategy": test_data.get('test_strategy', {}),
                 "test_files": test_data.get('test_files', []),
                 "test_files_created": test_files_created,
+                "workspace_changes": self.last_changes,
                 "raw_output": test_output
             }
         else:
@@ -86,55 +108,101 @@ class QAEngineer:
 
     def save_test_files(self, test_files_data: list) -> list:
         """
-        Save test files to disk
+        Save test files to the workflow workspace
         Args:
             test_files_data: List of test file dictionaries with path and content
         Returns:
-            List of created test file paths
+            List of test file paths in the workspace
         """
-        created_files = []
-        for file_info in test_files_data:
-            file_path = file_info.get('path', '')
-            content = file_info.get('content', '')
-            
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # Write file content
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            created_files.append(file_path)
-            console.print(f"[green]创建测试文件: {file_path}[/green]")
-        
-        return created_files
+        # Regenerated output replaces the previous iteration's files; disk is only touched on flush
+        changes = self.workspace.write_files(test_files_data, kind="test", replace=True)
+        self.last_changes = changes
+        for path in changes["added"] + changes["modified"]:
+            console.print(f"[green]创建测试文件: {path}[/green]")
+        for path in changes["rejected"]:
+            console.print(f"[red]写入文件失败: {path} (不安全的路径)[/red]")
+
+        return self.workspace.paths("test")
 
-    def execute_tests(self, implementation_code: str, test_cases: list) -> Dict[str, Any]:
+    def execute_tests(self, implementation_code: str, test_cases: list, code_files: list = None,
+                      test_files: list = None, python: str = None, fail_fast: bool = False) -> Dict[str, Any]:
         """
         Execute tests against implementation code
         Args:
             implementation_code: Code to test
             test_cases: List of test cases to execute
+            code_files: Coder output files to test against, defaults to the workspace's code files
+            test_files: Generated pytest files to run, defaults to the workspace's test files
+            python: Interpreter of the workflow's sandbox, defaults to the current one
+            fail_fast: Stop at the first failing test instead of running the whole suite
         Returns:
             Test execution results
         """
         console.print("[bold blue]QA Engineer 正在执行测试...[/bold blue]")
         
-        # In a real implementation, this would run the actual tests
-        # For now, we'll simulate the test execution
+        code_files = code_files if code_files is not None else self.workspace.files("code")
+        test_files = test_files if test_files is not None else self.workspace.files("test")
+        python = python or sys.executable
         try:
-            # This is where you would actually execute the tests
-            # For example, using subprocess to run pytest on the implementation
-            console.print("[green]测试执行完成！[/green]")
-            
-            return {
-                "success": True,
-                "passed": 5,  # Simulated test results
-                "failed": 0,
-                "skipped": 0,
-                "total": 5,
-                "details": "所有测试通过"
-            }
+            all_files = code_files + test_files
+            test_paths = [f.get('path', '') for f in test_files if f.get('path', '').endswith('.py')]
+            snapshot = {f.get('path', ''): content_digest(f.get('content', '')) for f in all_files}
+            graph = build_dependency_graph(all_files)
+            impact = self._select_tests(snapshot, graph, test_paths)
+            if impact["mode"] == "incremental":
+                console.print(f"[cyan]测试影响分析: 仅重跑 {len(impact['tests'])}/{len(test_paths)} 个测试文件[/cyan]")
+
+            # Test files whose code, dependencies and environment are unchanged come from the cache
+            cache_keys = self._result_cache_keys(snapshot, graph, impact["tests"], python)
+            cached_tests, to_run = [], []
+            for path in self._prioritized(impact["tests"], code_files):
+                cached = self.result_cache.get(cache_keys[path]) if path in cache_keys else None
+                if cached is None:
+                    to_run.append(path)
+                else:
+                    cached_tests.extend(dict(test, cached=True) for test in cached)
+            if cached_tests:
+                console.print(f"[cyan]测试结果缓存命中: {len(impact['tests']) - len(to_run)} 个测试文件[/cyan]")
+            skipped_paths = []
+            if fail_fast and any(t["outcome"] == "failed" for t in cached_tests):
+                # A known failure is already on hand; nothing else needs to run
+                skipped_paths, to_run = to_run, []
+
+            # Run the generated test files with pytest, sharded across worker processes, likely failures first
+            test_results = self.test_runner.run(
+                code_files=code_files,
+                test_files=test_files,
+                python=python,
+                selected_paths=to_run,
+                priorities=self.last_priorities,
+                fail_fast=fail_fast
+            )
+            stopped_early = bool(skipped_paths) or test_results.get("stopped_early", False)
+            self.history.record(test_results["tests"])
+            self.coverage_tests.update(test_results.get("coverage", {}).get("tests", {}))
+            self.coverage_tool = test_results.get("coverage", {}).get("tool") or self.coverage_tool
+            if not test_results["errors"] and not stopped_early:
+                self._store_results(test_results["tests"], to_run, cache_keys)
+
+            test_results = self._merge_results(test_results, cached_tests, impact["tests"], test_paths)
+            test_results["impact"] = impact
+            test_results["cache"] = self.result_cache.stats()
+            test_results["stopped_early"] = stopped_early
+
+            known = {t["nodeid"] for t in test_results["tests"]}
+            self.coverage_tests = {nodeid: entry for nodeid, entry in self.coverage_tests.items() if nodeid in known}
+            test_results["coverage"] = summarize_coverage(self.coverage_tests, self.coverage_tool)
+            if stopped_early:
+                console.print("[yellow]发现失败测试，已提前停止测试执行[/yellow]")
+            else:
+                # An incomplete run is no baseline for the next impact analysis
+                self.last_snapshot = snapshot
+                self.last_test_results = {t["nodeid"]: t for t in test_results["tests"]}
+            console.print(
+                f"[green]测试执行完成！通过 {test_results['passed']}, 失败 {test_results['failed']}, "
+                f"跳过 {test_results['skipped']} ({test_results['duration']}s, {test_results['shards']} 个分片)[/green]"
+            )
+            return test_results
         except Exception as e:
             console.print(f"[red]测试执行失败: {e}[/red]")
             return {
@@ -145,4 +213,109 @@ class QAEngineer:
                 "total": 1,
                 "details": str(e),
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+
+    def _select_tests(self, snapshot: Dict[str, str], graph: Optional[dict], test_paths: list) -> Dict[str, Any]:
+        """
+        Pick the test files affected since the previous execute_tests call
+        Args:
+            snapshot: Path -> content digest of the current code and test files
+            graph: Module dependency graph of the current files
+            test_paths: All current test files
+        Returns:
+            Impact selection ("full" falls back to every test file)
+        """
+        if not self.last_snapshot:
+            return {"mode": "full", "tests": test_paths, "reason": "no previous run"}
+        removed = set(self.last_snapshot) - set(snapshot)
+        if removed:
+            return {"mode": "full", "tests": test_paths, "reason": f"file removed: {sorted(removed)[0]}"}
+
+        changed = {path for path, digest in snapshot.items() if self.last_snapshot.get(path) != digest}
+        known_tests = {nodeid: test["file"] for nodeid, test in self.last_test_results.items()}
+        return select_affected_tests(test_paths, changed, graph, coverage_by_test_file(self.coverage_tests, known_tests))
+
+    def _prioritized(self, test_paths: list, code_files: list) -> list:
+        """
+        Order test files by failure probability and unique coverage, and remember the per-test scores
+        Args:
+            test_paths: Test files selected to run
+            code_files: Project files, whose coverage counts towards uniqueness
+        Returns:
+            Test files, highest priority first
+        """
+        known_tests = {nodeid: test["file"] for nodeid, test in self.last_test_results.items()}
+        code_paths = {f.get('path', '') for f in code_files}
+        priority = prioritize(test_paths, known_tests, self.history, self.coverage_tests, code_paths)
+        self.last_priorities = priority["scores"]
+        return priority["order"]
+
+    def _result_cache_keys(self, snapshot: Dict[str, str], graph: Optional[dict], test_paths: list,
+                           python: str) -> Dict[str, str]:
+        """
+        Cache key of every test file: its content, its transitive dependencies, the files pytest reads
+        without an import (non-Python project files, conftest.py files on its path) and the environment
+        Args:
+            snapshot: Path -> content digest of the current files
+            graph: Module dependency graph; without it dependencies are unknown and nothing is cached
+            test_paths: Test files to key
+            python: Interpreter the tests run with
+        Returns:
+            Test path -> cache key
+        """
+        if graph is None:
+            return {}
+        environment_key = fingerprint_digest(get_environment_fingerprint(python))
+        # Data and config files may be read by any test
+        data_files = {path: digest for path, digest in snapshot.items() if not path.endswith('.py')}
+        conftests = {path: digest for path, digest in snapshot.items() if os.path.basename(path) == "conftest.py"}
+        keys = {}
+        for path in test_paths:
+            dependencies = {dep: snapshot[dep] for dep in transitive_dependencies(graph, path)}
+            dependencies.update(data_files)
+            test_dir = os.path.dirname(path)
+            for conftest, digest in conftests.items():
+                conftest_dir = os.path.dirname(conftest)
+                if not conftest_dir or test_dir == conftest_dir or test_dir.startswith(conftest_dir + "/"):
+                    dependencies[conftest] = digest
+            keys[path] = result_cache_key(snapshot[path], dependencies, environment_key)
+        return keys
+
+    def _store_results(self, tests: list, run_paths: list, cache_keys: Dict[str, str]):
+        """
+        Cache the outcomes of the test files that just ran
+        Args:
+            tests: Per-test results of the run
+            run_paths: Test files that ran
+            cache_keys: Test path -> cache key
+        """
+        by_file = {}
+        for test in tests:
+            by_file.setdefault(test["file"], []).append(test)
+        for path in run_paths:
+            if path in cache_keys:
+                self.result_cache.put(cache_keys[path], by_file.get(path, []))
+        self.result_cache.evict()
+
+    def _merge_results(self, test_results: Dict[str, Any], cached_tests: list, selected_paths: list,
+                       test_paths: list) -> Dict[str, Any]:
+        """
+        Combine fresh, cached and carried-over outcomes into one result for the whole suite
+        Args:
+            test_results: Results of the tests that ran
+            cached_tests: Outcomes served from the result cache
+            selected_paths: Test files impact analysis selected
+            test_paths: All current test files
+        Returns:
+            Results covering the whole suite
+        """
+        # Tests impact analysis did not select keep their previous outcome
+        carried_over = [
+            dict(test, carried_over=True)
+            for test in self.last_test_results.values()
+            if test["file"] in test_paths and test["file"] not in selected_paths
+        ]
+        return self.test_runner.summarize(
+            test_results["tests"] + cached_tests + carried_over, test_results["errors"],
+            test_results["duration"], "", test_results["shards"]
+        )
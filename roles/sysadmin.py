@@ -5,36 +5,87 @@ Optimized for Linux environment based on experience base
 import subprocess
 import sys
 import os
+import shutil
+import signal
 import tempfile
-from typing import Dict, Any
+import threading
+from typing import Callable, Dict, Any, Optional
 from pathlib import Path
 
 from rich.console import Console
 from utils import load_prompt, safe_json_parse
 from memory.evolutionary_memory import evolutionary_memory
+from sandbox.capture import BoundedCapture, capture_results
+from sandbox.content_store import ContentStore, normalize_project_path
+from sandbox.dependencies import DistributionResolver, Wheelhouse, extract_missing_modules
+from sandbox.environment import get_environment_fingerprint, invalidate_environment_fingerprint
+from sandbox.forkserver import ForkServerRunner
+from sandbox.import_scanner import find_unavailable_modules, scan_third_party_imports
+from sandbox.monitor import ResourceMonitor
+from sandbox.venv_clone import VenvCloner
+from workspace.virtual import VirtualWorkspace
 
 console = Console()
 
+# Resource usage above these limits is flagged before the code is accepted
+DEFAULT_RESOURCE_LIMITS = {
+    "wall_time": 20.0,
+    "cpu_time": 15.0,
+    "peak_rss_bytes": 512 * 1024 * 1024,
+    "child_processes": 16
+}
+
 class SysAdmin:
     """
     System Administrator Role - runs code, manages environments, and fixes environment issues
     Optimized for Linux environment
     """
     
-    def __init__(self):
+    def __init__(self, execution_mode: str = "subprocess", run_timeout: float = 30,
+                 output_sink: Optional[Callable[[str, str], None]] = None,
+                 workspace: VirtualWorkspace = None):
+        """
+        Initialize SysAdmin role
+        Args:
+            execution_mode: "subprocess" starts a fresh interpreter per run,
+                "forkserver" forks each run from a pre-warmed interpreter
+            run_timeout: Seconds a single code run may take
+            output_sink: Optional callback receiving (stream, line) live while code runs
+            workspace: Workflow workspace projects are run and provisioned from
+        """
         self.temp_dirs = []
         self.prompts = load_prompt("roles/prompts/sysadmin.yaml")
         self.memory = evolutionary_memory
+        self.run_timeout = run_timeout
+        self.output_sink = output_sink
+        self.workspace = workspace or VirtualWorkspace()
+        self.python = sys.executable
+        self.wheelhouse = Wheelhouse()
+        self.venv_cloner = VenvCloner()
+        self.content_store = ContentStore()
+        self.resolver = DistributionResolver()
+        self.resource_limits = dict(DEFAULT_RESOURCE_LIMITS)
+        self.min_disk_free_bytes = 500 * 1024 * 1024
+        self.min_memory_available_bytes = 256 * 1024 * 1024
+        self.forkserver = None
+
+        if execution_mode == "forkserver" and not ForkServerRunner.is_supported():
+            console.print("[yellow]当前平台不支持 forkserver，回退到 subprocess 模式[/yellow]")
+            execution_mode = "subprocess"
+        self.execution_mode = execution_mode
+        if self.execution_mode == "forkserver":
+            self.forkserver = ForkServerRunner()
 
     def __del__(self):
         """Cleanup temporary directories on object deletion"""
         self.cleanup()
 
-    def create_sandbox_env(self, name: str = None) -> str:
+    def create_sandbox_env(self, name: str = None, activate: bool = False) -> str:
         """
         Create an isolated sandbox environment (Linux optimized)
         Args:
             name: Name for the sandbox (optional)
+            activate: Run code and install packages in this sandbox from now on
         Returns:
             Path to the sandbox environment
         """
@@ -45,12 +96,33 @@ class SysAdmin:
 
         self.temp_dirs.append(sandbox_path)
 
-        # Create a virtual environment in the sandbox using Linux-specific paths
-        subprocess.run([sys.executable, "-m", "venv", sandbox_path], check=True)
+        try:
+            # Clone the pre-provisioned base venv; installs in the sandbox only add deltas
+            python = self.venv_cloner.clone(sandbox_path)["python"]
+        except Exception as e:
+            console.print(f"[yellow]克隆基础虚拟环境失败 ({e})，改为新建虚拟环境[/yellow]")
+            # Create a virtual environment in the sandbox using Linux-specific paths
+            subprocess.run([sys.executable, "-m", "venv", "--clear", sandbox_path], check=True)
+            python = VenvCloner.python_path(sandbox_path)
+
+        if activate:
+            self.use_interpreter(python)
 
         console.print(f"[green]沙箱环境创建成功: {sandbox_path}[/green]")
         return sandbox_path
 
+    def use_interpreter(self, python: str):
+        """
+        Run code, check the environment and install packages with the given interpreter
+        Args:
+            python: Interpreter path, e.g. a sandbox venv's bin/python
+        """
+        self.python = python
+        self.wheelhouse = Wheelhouse(python=python)
+        if self.forkserver is not None and python != sys.executable:
+            # The forkserver is warmed up with the host interpreter, not the sandbox one
+            console.print("[yellow]沙箱解释器不同于主解释器，代码将以 subprocess 模式运行[/yellow]")
+
     def run_code_with_monitoring(self, code_content: str, environment_requirements: str = "") -> Dict[str, Any]:
         """
         Run code with monitoring and detailed reporting (Linux optimized)
@@ -60,40 +132,111 @@ class SysAdmin:
         Returns:
             Detailed execution results
         """
-        console.print("[bold blue]SysAdmin 正在运行代码...[/bold blue]")
+        return self.run_project_with_monitoring([{"path": "main.py", "content": code_content}], "main.py")
 
-        # Create a temporary file to run the code
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
-            f.write(code_content)
-            temp_file = f.name
+    def run_project_with_monitoring(self, code_files: list = None, entry_point: str = "") -> Dict[str, Any]:
+        """
+        Materialize a multi-file project in an isolated sandbox directory and run its entry point
+        Args:
+            code_files: Coder output, a list of {"path", "content"} dicts; defaults to the workspace's code files
+            entry_point: Project-relative script to run; detected when empty
+        Returns:
+            Detailed execution results
+        """
+        console.print("[bold blue]SysAdmin 正在运行代码...[/bold blue]")
+        if code_files is None:
+            code_files = self.workspace.files("code")
 
         try:
-            # Run the code in a subprocess using Linux-specific paths
-            result = subprocess.run(
-                [sys.executable, temp_file],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-
-            success = result.returncode == 0
-            stdout = result.stdout
-            stderr = result.stderr
-
+            entry_point = normalize_project_path(entry_point or self._detect_entry_point(code_files))
+        except ValueError as e:
             return {
-                "success": success,
-                "stdout": stdout,
-                "stderr": stderr,
-                "return_code": result.returncode
+                "success": False,
+                "stdout": "",
+                "stderr": str(e),
+                "return_code": -1
             }
-        except subprocess.TimeoutExpired:
+
+        # A fresh directory per run so concurrent workflows never share files
+        sandbox_dir = tempfile.mkdtemp(prefix="sandbox_run_")
+        try:
+            manifest = self.content_store.materialize(code_files, sandbox_dir)
+            script_path = os.path.join(sandbox_dir, entry_point)
+            if not os.path.exists(script_path):
+                return {
+                    "success": False,
+                    "stdout": "",
+                    "stderr": f"Entry point not found: {entry_point}",
+                    "return_code": -1
+                }
+
+            if self.forkserver is not None and self.python == sys.executable:
+                run_result = self.forkserver.run(script_path, timeout=self.run_timeout,
+                                                 line_sink=self.output_sink, cwd=sandbox_dir)
+            else:
+                run_result = self._run_in_subprocess(script_path, cwd=sandbox_dir)
+            run_result["entry_point"] = entry_point
+            run_result["materialized"] = manifest["methods"]
+            return self._report_resources(run_result)
+        except (OSError, ValueError) as e:
             return {
                 "success": False,
                 "stdout": "",
-                "stderr": "Execution timed out",
+                "stderr": str(e),
                 "return_code": -1
             }
+        finally:
+            shutil.rmtree(sandbox_dir, ignore_errors=True)
+
+    def _detect_entry_point(self, code_files: list) -> str:
+        """
+        Pick the script to run when the Coder did not declare one
+        Args:
+            code_files: Coder output, a list of {"path", "content"} dicts
+        Returns:
+            Project-relative path of the entry point
+        """
+        python_files = [f for f in code_files if f.get('path', '').endswith('.py')]
+        for candidate in ("main.py", "app.py", "run.py"):
+            for file_info in python_files:
+                if file_info['path'] == candidate:
+                    return candidate
+        for file_info in python_files:
+            if "__name__" in file_info.get('content', '') and "__main__" in file_info.get('content', ''):
+                return file_info['path']
+        return python_files[0]['path'] if python_files else ""
+
+    def _run_in_subprocess(self, script_path: str, cwd: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run a script in a fresh interpreter
+        Args:
+            script_path: Path of the script to run
+            cwd: Project root the script runs in; also put on PYTHONPATH
+        Returns:
+            Execution results with bounded stdout/stderr, return code and resource usage
+        """
+        stdout_capture = BoundedCapture("stdout", line_sink=self.output_sink)
+        stderr_capture = BoundedCapture("stderr", line_sink=self.output_sink)
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+
+        env = os.environ.copy()
+        if cwd:
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [cwd, env.get("PYTHONPATH")]))
+
+        try:
+            # Run the code in its own session so a timeout can kill everything it spawned
+            process = subprocess.Popen(
+                [self.python, script_path],
+                stdout=stdout_write,
+                stderr=stderr_write,
+                cwd=cwd,
+                env=env,
+                start_new_session=True
+            )
         except Exception as e:
+            os.close(stdout_read)
+            os.close(stderr_read)
             return {
                 "success": False,
                 "stdout": "",
@@ -101,8 +244,77 @@ class SysAdmin:
                 "return_code": -1
             }
         finally:
-            # Clean up the temporary file
-            os.unlink(temp_file)
+            os.close(stdout_write)
+            os.close(stderr_write)
+
+        monitor = ResourceMonitor(process.pid).start()
+        pumps = [stdout_capture.start_pump(stdout_read), stderr_capture.start_pump(stderr_read)]
+
+        timed_out = threading.Event()
+
+        def _kill_on_timeout():
+            timed_out.set()
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        timer = threading.Timer(self.run_timeout, _kill_on_timeout)
+        timer.start()
+        try:
+            # wait4 reaps the child and hands back its exact rusage
+            _, status, rusage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        monitor.mark_finished()
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        for pump in pumps:
+            # Background grandchildren may keep the pipes open; don't wait on them forever
+            pump.join(timeout=1)
+
+        result = capture_results(stdout_capture, stderr_capture)
+        result["resources"] = monitor.stop(rusage)
+        if timed_out.is_set():
+            result.update({
+                "success": False,
+                "stderr": result["stderr"] + "\nExecution timed out",
+                "return_code": -1
+            })
+            return result
+
+        result.update({
+            "success": process.returncode == 0,
+            "return_code": process.returncode
+        })
+        return result
+
+    def _report_resources(self, run_result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Print resource usage of a run and flag slow or memory-hungry programs
+        Args:
+            run_result: Result returned by one of the runners
+        Returns:
+            The same result with resource_warnings added
+        """
+        resources = run_result.get("resources")
+        warnings = []
+        if resources:
+            console.print(
+                f"[cyan]资源使用: 墙钟 {resources['wall_time']:.2f}s, "
+                f"CPU {resources['cpu_time']:.2f}s, "
+                f"峰值内存 {resources['peak_rss_bytes'] / (1024 * 1024):.1f}MB, "
+                f"读 {resources['io_read_bytes']}B / 写 {resources['io_write_bytes']}B, "
+                f"子进程 {resources['child_processes']}[/cyan]"
+            )
+            for key, limit in self.resource_limits.items():
+                if resources.get(key, 0) > limit:
+                    warnings.append(f"{key}={resources[key]} exceeds {limit}")
+            for warning in warnings:
+                console.print(f"[yellow]资源警告: {warning}[/yellow]")
+
+        run_result["resource_warnings"] = warnings
+        return run_result
 
     def analyze_error_and_fix(self, error_message: str) -> Dict[str, Any]:
         """
@@ -116,18 +328,15 @@ class SysAdmin:
 
         # Check for common error patterns in Linux environment
         if "ModuleNotFoundError" in error_message or "ImportError" in error_message:
-            # Try to identify missing modules
-            import re
-            module_match = re.search(r"named ['\"]([^'\"]+)['\"]", error_message)
-            if module_match:
-                missing_module = module_match.group(1)
-                console.print(f"[yellow]检测到缺失模块: {missing_module}[/yellow]")
-                
-                # Attempt to install the missing module using Linux-specific pip
-                fix_result = self.attempt_install_package(missing_module)
+            # Collect every missing module so they are installed in a single pip run
+            missing_modules = extract_missing_modules(error_message)
+            if missing_modules:
+                console.print(f"[yellow]检测到缺失模块: {', '.join(missing_modules)}[/yellow]")
+
+                fix_result = self.install_packages(missing_modules)
                 return {
                     "fixed": fix_result["success"],
-                    "action_taken": f"Attempted to install {missing_module}",
+                    "action_taken": f"Attempted to install {', '.join(fix_result['packages'])}",
                     "result": fix_result
                 }
         
@@ -138,137 +347,143 @@ class SysAdmin:
             "error_analysis": error_message
         }
 
+    def provision_dependencies(self, code_files: list = None) -> Dict[str, Any]:
+        """
+        Install every third-party module the project imports before its first run
+        Args:
+            code_files: Coder output, a list of {"path", "content"} dicts; defaults to every workspace file
+        Returns:
+            Provisioning result with the scanned and missing modules
+        """
+        console.print("[bold blue]SysAdmin 正在扫描依赖...[/bold blue]")
+        if code_files is None:
+            code_files = self.workspace.files()
+
+        third_party = scan_third_party_imports(code_files)
+        missing = find_unavailable_modules(third_party, python=self.python)
+        result = {
+            "success": True,
+            "third_party_modules": sorted(third_party),
+            "missing_modules": missing,
+            "install_result": None
+        }
+
+        if missing:
+            install_result = self.install_packages(missing)
+            result["success"] = install_result["success"]
+            result["install_result"] = install_result
+        else:
+            console.print("[green]所有依赖已就绪[/green]")
+        return result
+
+    def install_packages(self, module_names: list) -> Dict[str, Any]:
+        """
+        Install the distributions providing the given import names in one batch
+        Args:
+            module_names: Import names, e.g. ["cv2", "requests"]
+        Returns:
+            Installation result
+        """
+        distributions = []
+        for module_name in module_names:
+            distribution = self.resolver.resolve(module_name)
+            if distribution not in distributions:
+                distributions.append(distribution)
+
+        console.print(f"[yellow]尝试批量安装包: {', '.join(distributions)}[/yellow]")
+        result = self.wheelhouse.install(distributions, timeout=300)
+        invalidate_environment_fingerprint(self.python)
+
+        if result["success"]:
+            console.print(f"[green]包 {', '.join(distributions)} 安装成功[/green]")
+        else:
+            console.print(f"[red]包 {', '.join(distributions)} 安装失败[/red]")
+        return result
+
     def attempt_install_package(self, package_name: str) -> Dict[str, Any]:
         """
         Attempt to install a package (Linux optimized)
         Args:
-            package_name: Name of the package to install
+            package_name: Name of the package (or import name) to install
         Returns:
             Installation result
         """
-        console.print(f"[yellow]尝试安装包: {package_name}[/yellow]")
-        
-        try:
-            # Use Linux-specific pip command
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "install", package_name],
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout for installation
-            )
-            
-            success = result.returncode == 0
-            stdout = result.stdout
-            stderr = result.stderr
-            
-            if success:
-                console.print(f"[green]包 {package_name} 安装成功[/green]")
-            else:
-                console.print(f"[red]包 {package_name} 安装失败[/red]")
-            
-            return {
-                "success": success,
-                "stdout": stdout,
-                "stderr": stderr,
-                "return_code": result.returncode
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                "success": False,
-                "stdout": "",
-                "stderr": "Installation timed out",
-                "return_code": -1
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "stdout": "",
-                "stderr": str(e),
-                "return_code": -1
-            }
+        return self.install_packages([package_name])
 
     def install_dependencies_with_reporting(self, dependencies_list: str) -> Dict[str, Any]:
         """
         Install dependencies with detailed reporting (Linux optimized)
         Args:
-            dependencies_list: List of dependencies to install
+            dependencies_list: Requirements-file style list of dependencies to install
         Returns:
             Installation results
         """
         console.print("[bold blue]SysAdmin 正在安装依赖...[/bold blue]")
 
-        # Create a temporary requirements file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as f:
-            f.write(dependencies_list)
-            req_file = f.name
+        requirements = []
+        for line in dependencies_list.splitlines():
+            requirement = line.split('#', 1)[0].strip()
+            if requirement:
+                requirements.append(requirement)
 
-        try:
-            # Use Linux-specific pip command
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "install", "-r", req_file],
-                capture_output=True,
-                text=True,
-                timeout=600  # 10 minute timeout for installation
-            )
-
-            success = result.returncode == 0
-            stdout = result.stdout
-            stderr = result.stderr
-
-            return {
-                "success": success,
-                "stdout": stdout,
-                "stderr": stderr,
-                "return_code": result.returncode
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                "success": False,
-                "stdout": "",
-                "stderr": "Installation timed out",
-                "return_code": -1
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "stdout": "",
-                "stderr": str(e),
-                "return_code": -1
-            }
-        finally:
-            # Clean up the temporary file
-            os.unlink(req_file)
+        result = self.wheelhouse.install(requirements, timeout=600)
+        invalidate_environment_fingerprint(self.python)
+        return result
 
     def check_environment(self, check_requirements: str = "") -> Dict[str, Any]:
         """
         Check the environment for requirements (Linux optimized)
         Args:
-            check_requirements: What to check in the environment
+            check_requirements: Comma or newline separated distributions that must be installed
         Returns:
             Environment check results
         """
         console.print("[bold blue]SysAdmin 正在检查环境...[/bold blue]")
 
         try:
-            # Check if Python is available (Linux specific)
-            result = subprocess.run(['python3', '--version'], capture_output=True, text=True)
-            python_version = result.stdout.strip() if result.returncode == 0 else "Not found"
-
-            # Check if pip is available (Linux specific)
-            result = subprocess.run(['python3', '-m', 'pip', '--version'], capture_output=True, text=True)
-            pip_version = result.stdout.strip() if result.returncode == 0 else "Not found"
-
-            return {
-                "status": "OK",
-                "python_version": python_version,
-                "pip_version": pip_version
-            }
+            # Probed once per interpreter and served from cache afterwards
+            fingerprint = get_environment_fingerprint(self.python)
         except Exception as e:
             return {
+                "success": False,
                 "status": "ERROR",
                 "error": str(e)
             }
 
+        required = [name.strip().lower() for name in check_requirements.replace(',', '\n').splitlines() if name.strip()]
+        missing_requirements = [name for name in required if name not in fingerprint["distributions"]]
+
+        warnings = []
+        if fingerprint["disk_free_bytes"] < self.min_disk_free_bytes:
+            warnings.append(f"磁盘剩余空间不足: {fingerprint['disk_free_bytes']} 字节")
+        memory_available = fingerprint["memory_available_bytes"]
+        if memory_available is not None and memory_available < self.min_memory_available_bytes:
+            warnings.append(f"可用内存不足: {memory_available} 字节")
+        for warning in warnings:
+            console.print(f"[yellow]{warning}[/yellow]")
+
+        errors = []
+        if not fingerprint["pip_version"]:
+            errors.append("pip not available")
+        if missing_requirements:
+            errors.append(f"missing requirements: {', '.join(missing_requirements)}")
+
+        result = {
+            "success": not errors,
+            "status": "OK" if not errors else "ERROR",
+            "python_version": fingerprint["python_version"],
+            "pip_version": fingerprint["pip_version"] or "Not found",
+            "interpreter": fingerprint["interpreter"],
+            "distribution_count": len(fingerprint["distributions"]),
+            "missing_requirements": missing_requirements,
+            "disk_free_bytes": fingerprint["disk_free_bytes"],
+            "memory_available_bytes": memory_available,
+            "warnings": warnings
+        }
+        if errors:
+            result["error"] = "; ".join(errors)
+        return result
+
     def cleanup(self):
         """Clean up all temporary directories"""
         for temp_dir in self.temp_dirs:
@@ -6,6 +6,7 @@ from typing import Dict, Any
 from config import WORKER_CONFIG
 from utils import clean_json_text, call_llm, load_prompt, safe_json_parse
 from rich.console import Console
+from workspace.virtual import VirtualWorkspace
 
 console = Console()
 
@@ -14,20 +15,24 @@ class TechLead:
     TechLead Role - responsible for code review and quality assurance
     """
     
-    def __init__(self, model_name="gemini-1.5-pro"):
+    def __init__(self, model_name="gemini-1.5-pro", workspace: VirtualWorkspace = None):
         """
         Initialize TechLead role
         Args:
             model_name: Model name, defaults to "gemini-1.5-pro"
+            workspace: Workflow workspace holding the code under review
         """
         self.model_name = model_name
         self.techlead_config = WORKER_CONFIG
+        self.workspace = workspace or VirtualWorkspace()
+        # Workspace snapshot at the previous review, to point re-reviews at what changed
+        self.last_review_snapshot = {}
 
     def review_code(self, code: str, design_document: str, task_description: str) -> Dict[str, Any]:
         """
         Review code implementation against design document
         Args:
-            code: Code to review
+            code: Code to review; when empty, the workspace's code files are reviewed
             design_document: Original design document
             task_description: Task description
         Returns:
@@ -45,6 +50,9 @@ class TechLead:
             # Fallback prompt if file not found
             prompt_template = "你是技术主管。请审查以下代码：{code}，基于设计文档：{design_doc} 和任务描述：{task_desc}。返回是否批准及反馈。"
         
+        if not code:
+            code = self._workspace_code()
+
         prompt = prompt_template.format(
             code=code,
             design_doc=design_document,
@@ -84,4 +92,16 @@ class TechLead:
                 "suggestions": [],
                 "raw_response": "",
                 "error": "TechLead AI 未初始化"
-            }
\ No newline at end of file
+            }
+
+    def _workspace_code(self) -> str:
+        """Code files of the workspace as review input, listing what changed since the last review"""
+        snapshot = self.workspace.snapshot("code")
+        code = self.workspace.render("code")
+        if self.last_review_snapshot:
+            changes = self.workspace.diff(self.last_review_snapshot, "code")
+            changed = [f"{kind}: {', '.join(paths)}" for kind, paths in changes.items() if paths]
+            if changed:
+                code = "自上次审查以来的变更 -> " + "; ".join(changed) + "\n\n" + code
+        self.last_review_snapshot = snapshot
+        return code
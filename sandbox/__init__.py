@@ -0,0 +1,8 @@
+"""
+Sandbox Package for Virtual Software Company - Next Generation
+"""
+from .forkserver import ForkServerRunner
+
+__all__ = [
+    'ForkServerRunner'
+]
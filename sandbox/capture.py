@@ -0,0 +1,165 @@
+"""
+Bounded Output Capture - Next Generation
+Streams a child's output into a head + tail buffer so memory stays flat no matter how much it prints
+"""
+import os
+import threading
+from typing import Callable, Dict, Any, Optional
+
+DEFAULT_HEAD_BYTES = 32 * 1024
+DEFAULT_TAIL_BYTES = 32 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+# Longest partial line kept while waiting for a newline to forward
+MAX_PENDING_LINE_BYTES = 8 * 1024
+
+
+class BoundedCapture:
+    """
+    Keeps the first head_bytes and the last tail_bytes of a stream plus exact byte counts
+    """
+
+    def __init__(self, name: str, head_bytes: int = DEFAULT_HEAD_BYTES, tail_bytes: int = DEFAULT_TAIL_BYTES,
+                 line_sink: Optional[Callable[[str, str], None]] = None):
+        """
+        Initialize the capture
+        Args:
+            name: Stream name passed to line_sink ("stdout" / "stderr")
+            head_bytes: Bytes kept from the start of the stream
+            tail_bytes: Bytes kept from the end of the stream
+            line_sink: Optional callback receiving (name, line) for every complete line
+        """
+        self.name = name
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.line_sink = line_sink
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total_bytes = 0
+        self._pending_line = bytearray()
+
+    def feed(self, data: bytes):
+        """
+        Append a chunk of output
+        Args:
+            data: Raw bytes read from the stream
+        """
+        if not data:
+            return
+        self.total_bytes += len(data)
+
+        head_room = self.head_bytes - len(self.head)
+        if head_room > 0:
+            self.head += data[:head_room]
+            data_for_tail = data[head_room:]
+        else:
+            data_for_tail = data
+        if data_for_tail:
+            self.tail += data_for_tail
+            if len(self.tail) > self.tail_bytes:
+                del self.tail[:len(self.tail) - self.tail_bytes]
+
+        if self.line_sink is not None:
+            self._forward_lines(data)
+
+    def finish(self):
+        """Flush a trailing line without newline to the sink"""
+        if self.line_sink is not None and self._pending_line:
+            self._emit(bytes(self._pending_line))
+            self._pending_line.clear()
+
+    @property
+    def truncated(self) -> bool:
+        """Whether bytes were dropped between head and tail"""
+        return self.total_bytes > len(self.head) + len(self.tail)
+
+    def text(self) -> str:
+        """
+        Render the captured output
+        Returns:
+            Head and tail joined by a truncation marker when bytes were dropped
+        """
+        head = self.head.decode('utf-8', errors='replace')
+        if not self.truncated:
+            return head + self.tail.decode('utf-8', errors='replace')
+        dropped = self.total_bytes - len(self.head) - len(self.tail)
+        return (
+            head
+            + f"\n... [输出已截断: 省略 {dropped} 字节, 共 {self.total_bytes} 字节] ...\n"
+            + self.tail.decode('utf-8', errors='replace')
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Byte counts for the result dict"""
+        return {
+            "total_bytes": self.total_bytes,
+            "kept_bytes": len(self.head) + len(self.tail),
+            "truncated": self.truncated
+        }
+
+    def pump_fd(self, fd: int):
+        """
+        Read a file descriptor until EOF, then close it
+        Args:
+            fd: Read end of the child's pipe
+        """
+        try:
+            while True:
+                chunk = os.read(fd, READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                self.feed(chunk)
+        finally:
+            os.close(fd)
+            self.finish()
+
+    def start_pump(self, fd: int) -> threading.Thread:
+        """
+        Pump a file descriptor on a daemon thread
+        Args:
+            fd: Read end of the child's pipe
+        Returns:
+            The started thread
+        """
+        thread = threading.Thread(target=self.pump_fd, args=(fd,), daemon=True)
+        thread.start()
+        return thread
+
+    def _forward_lines(self, data: bytes):
+        """Split data into lines and hand complete ones to the sink"""
+        *complete, rest = data.split(b"\n")
+        if complete:
+            self._emit(bytes(self._pending_line) + complete[0])
+            self._pending_line.clear()
+            for line in complete[1:]:
+                self._emit(line)
+        self._pending_line += rest
+        if len(self._pending_line) > MAX_PENDING_LINE_BYTES:
+            # A giant line without newline: forward what we have rather than buffer it all
+            self._emit(bytes(self._pending_line))
+            self._pending_line.clear()
+
+    def _emit(self, line: bytes):
+        """Send one line to the sink, never letting a sink error break capture"""
+        try:
+            self.line_sink(self.name, line.decode('utf-8', errors='replace'))
+        except Exception:
+            pass
+
+
+def capture_results(stdout: BoundedCapture, stderr: BoundedCapture) -> Dict[str, Any]:
+    """
+    Build the output part of a run result
+    Args:
+        stdout: Capture of the child's stdout
+        stderr: Capture of the child's stderr
+    Returns:
+        Dictionary with stdout, stderr and output_stats
+    """
+    return {
+        "stdout": stdout.text(),
+        "stderr": stderr.text(),
+        "output_stats": {
+            "stdout": stdout.stats(),
+            "stderr": stderr.stats()
+        }
+    }
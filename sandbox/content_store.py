@@ -0,0 +1,227 @@
+"""
+Content Store - Next Generation
+Content-addressed blob store used to materialize generated projects into sandbox directories
+"""
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path, PurePosixPath
+from typing import Dict, Any, List, Optional
+
+DEFAULT_CONTENT_STORE = os.getenv(
+    "CONTENT_STORE_DIR",
+    str(Path.home() / ".cache" / "virtual_company" / "content_store")
+)
+
+# ioctl request number for a copy-on-write clone on btrfs/xfs (linux/fs.h)
+FICLONE = 0x40049409
+# Seconds between two evictions run by the same store
+EVICT_INTERVAL = 3600
+
+
+def content_digest(content: str) -> str:
+    """
+    SHA-256 digest identifying a file content
+    Args:
+        content: File content
+    Returns:
+        Hex digest
+    """
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def normalize_project_path(path: str) -> str:
+    """
+    Validate a generated file path and make it relative to the project root
+    Args:
+        path: Path as produced by the Coder
+    Returns:
+        Normalized relative POSIX path
+    Raises:
+        ValueError: If the path is empty, absolute or escapes the project root
+    """
+    pure = PurePosixPath(path.replace('\\', '/'))
+    if not path or pure.is_absolute() or '..' in pure.parts:
+        raise ValueError(f"Unsafe project path: {path!r}")
+    return str(pure)
+
+
+def place_file(source: str, destination: str, hardlink: bool = True, mode: Optional[int] = None) -> str:
+    """
+    Place a file, preferring a copy-on-write clone, then a hardlink, then a plain copy
+    Args:
+        source: Existing file
+        destination: Path to create; must not exist
+        hardlink: Whether the destination may share the source's inode (writes would reach the source)
+        mode: Permissions of a cloned or copied destination, defaults to the source's
+    Returns:
+        "reflink", "hardlink" or "copy"
+    """
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        method = "reflink"
+    except OSError:
+        # Filesystem without reflink support (ext4, tmpfs, ...) or a different device
+        if os.path.exists(destination):
+            os.unlink(destination)
+        if hardlink:
+            try:
+                os.link(source, destination)
+                return "hardlink"
+            except OSError:
+                pass
+        shutil.copy2(source, destination)
+        method = "copy"
+
+    if mode is None:
+        shutil.copymode(source, destination)
+    else:
+        os.chmod(destination, mode)
+    return method
+
+
+def _write_file(content: str, destination: str):
+    """Write a private, writable copy of content"""
+    if os.path.exists(destination):
+        os.unlink(destination)
+    with open(destination, 'wb') as f:
+        f.write(content.encode('utf-8'))
+    os.chmod(destination, 0o644)
+
+
+class ContentStore:
+    """
+    Stores each distinct file content once and links it into sandboxes
+    """
+
+    def __init__(self, root: str = DEFAULT_CONTENT_STORE, max_age_days: float = 7,
+                 max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Initialize the store
+        Args:
+            root: Directory holding the blobs
+            max_age_days: Blobs no sandbox links to are evicted once unused for this long
+            max_bytes: Total blob size above which the least recently used unlinked blobs are evicted
+        """
+        self.root = root
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._next_evict = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, content: str) -> str:
+        """
+        Store content if it is not stored yet
+        Args:
+            content: File content
+        Returns:
+            SHA-256 digest of the content
+        """
+        data = content.encode('utf-8')
+        digest = content_digest(content)
+        blob_path = self.blob_path(digest)
+        if os.path.exists(blob_path):
+            try:
+                # mtime doubles as the LRU timestamp
+                os.utime(blob_path)
+            except OSError:
+                pass
+            return digest
+
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), prefix=".tmp_")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # Blobs are shared by every sandbox linking them, so keep them read-only
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, blob_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return digest
+
+    def blob_path(self, digest: str) -> str:
+        """Location of a blob in the store"""
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def evict(self) -> int:
+        """
+        Drop blobs no sandbox links to (link count 1) that are older than max_age_days, then the
+        least recently used of them while the store is larger than max_bytes
+        Returns:
+            Number of evicted blobs
+        """
+        blobs, total = [], 0
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith(".tmp_"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                total += stat.st_size
+                if stat.st_nlink == 1:
+                    blobs.append((stat.st_mtime, stat.st_size, path))
+
+        blobs.sort()
+        cutoff = time.time() - self.max_age_days * 86400
+        evicted = 0
+        for mtime, size, path in blobs:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def materialize(self, code_files: List[Dict[str, str]], target_dir: str) -> Dict[str, Any]:
+        """
+        Lay out a project in target_dir using reflinks, hardlinks or copies of the stored blobs.
+        Only Python sources go through the store, and only when not running as root (root ignores
+        the blobs' read-only mode); everything else is written as a private, writable copy
+        Args:
+            code_files: List of {"path", "content"} dicts
+            target_dir: Empty sandbox directory
+        Returns:
+            Mapping of relative path to digest plus how each file was placed
+        """
+        if time.time() >= self._next_evict:
+            self._next_evict = time.time() + EVICT_INTERVAL
+            self.evict()
+
+        manifest = {"files": {}, "methods": {"reflink": 0, "hardlink": 0, "copy": 0}}
+        link_sources = hasattr(os, "geteuid") and os.geteuid() != 0
+        for file_info in code_files:
+            relative_path = normalize_project_path(file_info.get('path', ''))
+            content = file_info.get('content', '')
+            destination = os.path.join(target_dir, relative_path)
+            os.makedirs(os.path.dirname(destination) or target_dir, exist_ok=True)
+            if os.path.exists(destination):
+                os.unlink(destination)
+
+            digest, method = content_digest(content), "copy"
+            if link_sources and relative_path.endswith('.py'):
+                try:
+                    method = place_file(self.blob_path(self.put(content)), destination)
+                except FileNotFoundError:
+                    # Evicted by another process in between
+                    pass
+            if method == "copy":
+                # Files that would be copied out of the store anyway are written directly
+                _write_file(content, destination)
+            manifest["files"][relative_path] = digest
+            manifest["methods"][method] += 1
+        return manifest
@@ -0,0 +1,236 @@
+"""
+Dependency Provisioning - Next Generation
+Maps import names to distributions and installs them in one batch through a local wheelhouse
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, Any, List
+
+from rich.console import Console
+
+console = Console()
+
+# Import names whose distribution on PyPI is named differently
+IMPORT_TO_DISTRIBUTION = {
+    "cv2": "opencv-python",
+    "PIL": "Pillow",
+    "yaml": "PyYAML",
+    "sklearn": "scikit-learn",
+    "skimage": "scikit-image",
+    "bs4": "beautifulsoup4",
+    "dotenv": "python-dotenv",
+    "dateutil": "python-dateutil",
+    "serial": "pyserial",
+    "usb": "pyusb",
+    "zmq": "pyzmq",
+    "Crypto": "pycryptodome",
+    "jwt": "PyJWT",
+    "magic": "python-magic",
+    "docx": "python-docx",
+    "pptx": "python-pptx",
+    "fitz": "PyMuPDF",
+    "OpenGL": "PyOpenGL",
+    "attr": "attrs",
+    "gi": "PyGObject",
+    "wx": "wxPython",
+    "Xlib": "python-xlib",
+    "telegram": "python-telegram-bot",
+    "MySQLdb": "mysqlclient",
+    "psycopg2": "psycopg2-binary",
+    "pkg_resources": "setuptools",
+}
+
+DEFAULT_WHEELHOUSE = os.getenv(
+    "WHEELHOUSE_DIR",
+    str(Path.home() / ".cache" / "virtual_company" / "wheelhouse")
+)
+
+MISSING_MODULE_PATTERN = re.compile(r"No module named ['\"]([^'\"]+)['\"]")
+
+
+def resolve_distribution(module_name: str) -> str:
+    """
+    Map an import name to the distribution that provides it
+    Args:
+        module_name: Module name as written in an import, e.g. "cv2.aruco"
+    Returns:
+        Distribution name to pass to pip, e.g. "opencv-python"
+    """
+    top_level = module_name.split('.')[0]
+    return IMPORT_TO_DISTRIBUTION.get(top_level, top_level)
+
+
+def extract_missing_modules(error_message: str) -> List[str]:
+    """
+    Find every module reported missing in an error message
+    Args:
+        error_message: stderr of a failed run
+    Returns:
+        Top-level module names in order of appearance, without duplicates
+    """
+    modules = []
+    for match in MISSING_MODULE_PATTERN.finditer(error_message):
+        top_level = match.group(1).split('.')[0]
+        if top_level not in modules:
+            modules.append(top_level)
+    return modules
+
+
+class DistributionResolver:
+    """
+    Caches import name -> distribution resolution on disk next to the wheelhouse
+    """
+
+    def __init__(self, cache_file: str = os.path.join(DEFAULT_WHEELHOUSE, "resolution_cache.json")):
+        """
+        Initialize the resolver
+        Args:
+            cache_file: JSON file persisting resolutions across runs
+        """
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._installed = None
+        self.cache = self._load()
+
+    def resolve(self, module_name: str) -> str:
+        """
+        Map an import name to its distribution, consulting the cache first
+        Args:
+            module_name: Module name as written in an import
+        Returns:
+            Distribution name to pass to pip
+        """
+        top_level = module_name.split('.')[0]
+        with self._lock:
+            if top_level in self.cache:
+                return self.cache[top_level]
+
+        if top_level in IMPORT_TO_DISTRIBUTION:
+            distribution = IMPORT_TO_DISTRIBUTION[top_level]
+        else:
+            # Distributions installed on the host already know which modules they provide
+            if self._installed is None:
+                self._installed = metadata.packages_distributions()
+            providers = self._installed.get(top_level)
+            distribution = providers[0] if providers else top_level
+
+        self.record(top_level, distribution)
+        return distribution
+
+    def record(self, module_name: str, distribution: str):
+        """
+        Remember a resolution and persist it
+        Args:
+            module_name: Top-level import name
+            distribution: Distribution providing it
+        """
+        with self._lock:
+            if self.cache.get(module_name) == distribution:
+                return
+            self.cache[module_name] = distribution
+            try:
+                os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+                with open(self.cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            except OSError as e:
+                console.print(f"[yellow]保存依赖解析缓存失败: {e}[/yellow]")
+
+    def _load(self) -> Dict[str, str]:
+        """Load the persisted cache"""
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+class Wheelhouse:
+    """
+    Local wheel cache; installs are served offline from it and only cache misses hit the index
+    """
+
+    def __init__(self, path: str = DEFAULT_WHEELHOUSE, python: str = sys.executable):
+        """
+        Initialize the wheelhouse
+        Args:
+            path: Directory holding cached wheels
+            python: Interpreter whose environment receives the packages
+        """
+        self.path = path
+        self.python = python
+        os.makedirs(self.path, exist_ok=True)
+
+    def install(self, requirements: List[str], timeout: int = 600) -> Dict[str, Any]:
+        """
+        Install all requirements in a single resolver run
+        Args:
+            requirements: Requirement specifiers, e.g. ["requests", "opencv-python>=4"]
+            timeout: Seconds allowed for each pip invocation
+        Returns:
+            Installation result
+        """
+        if not requirements:
+            return {
+                "success": True,
+                "stdout": "",
+                "stderr": "",
+                "return_code": 0,
+                "packages": [],
+                "source": "none"
+            }
+
+        # Fast path: everything is already in the wheelhouse
+        result = self._pip(["install", "--no-index", "--find-links", self.path] + requirements, timeout)
+        if result["success"]:
+            console.print(f"[green]已从本地 wheelhouse 离线安装: {', '.join(requirements)}[/green]")
+            result.update({"packages": requirements, "source": "wheelhouse"})
+            return result
+
+        # Cache miss: one resolver run builds/downloads every wheel into the wheelhouse
+        console.print(f"[yellow]wheelhouse 未命中，正在批量获取: {', '.join(requirements)}[/yellow]")
+        fetch = self._pip(["wheel", "--wheel-dir", self.path, "--find-links", self.path] + requirements, timeout)
+        if not fetch["success"]:
+            fetch.update({"packages": requirements, "source": "index"})
+            return fetch
+
+        result = self._pip(["install", "--no-index", "--find-links", self.path] + requirements, timeout)
+        result.update({"packages": requirements, "source": "index"})
+        return result
+
+    def _pip(self, args: List[str], timeout: int) -> Dict[str, Any]:
+        """Run pip for the target interpreter"""
+        try:
+            result = subprocess.run(
+                [self.python, "-m", "pip"] + args,
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+            return {
+                "success": result.returncode == 0,
+                "stdout": result.stdout,
+                "stderr": result.stderr,
+                "return_code": result.returncode
+            }
+        except subprocess.TimeoutExpired:
+            return {
+                "success": False,
+                "stdout": "",
+                "stderr": "Installation timed out",
+                "return_code": -1
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "stdout": "",
+                "stderr": str(e),
+                "return_code": -1
+            }
@@ -0,0 +1,138 @@
+"""
+Environment Fingerprint - Next Generation
+Probes an interpreter once and answers environment checks from a cache
+"""
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from importlib import metadata
+from typing import Dict, Any, Optional, Tuple
+
+# Probe executed by a foreign interpreter; prints the same fields as _probe_current
+PROBE_SCRIPT = """
+import json, platform, sys
+from importlib import metadata
+dists = {}
+for dist in metadata.distributions():
+    name = dist.metadata['Name']
+    if name:
+        dists[name.lower()] = dist.version
+print(json.dumps({
+    "python_version": "Python " + platform.python_version(),
+    "pip_version": dists.get("pip"),
+    "prefix": sys.prefix,
+    "distributions": dists,
+}))
+"""
+
+_cache: Dict[Tuple[str, float], Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def _interpreter_key(python: str) -> Tuple[str, float]:
+    """Cache key: interpreter path and its mtime"""
+    # Not resolved: a venv's python is a symlink to the base interpreter but has its own packages
+    path = os.path.abspath(python)
+    return path, os.stat(path).st_mtime
+
+
+def _probe_current() -> Dict[str, Any]:
+    """Probe the running interpreter in-process"""
+    distributions = {}
+    for dist in metadata.distributions():
+        name = dist.metadata['Name']
+        if name:
+            distributions[name.lower()] = dist.version
+    return {
+        "python_version": f"Python {platform.python_version()}",
+        "pip_version": distributions.get("pip"),
+        "prefix": sys.prefix,
+        "distributions": distributions
+    }
+
+
+def _probe_foreign(python: str) -> Dict[str, Any]:
+    """Probe another interpreter with a single subprocess"""
+    result = subprocess.run([python, "-c", PROBE_SCRIPT], capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"{python} exited with {result.returncode}")
+    return json.loads(result.stdout)
+
+
+def _memory_available_bytes() -> Optional[int]:
+    """MemAvailable from /proc/meminfo"""
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def get_environment_fingerprint(python: str = sys.executable, refresh: bool = False) -> Dict[str, Any]:
+    """
+    Return the cached fingerprint of an interpreter, probing it on first use
+    Args:
+        python: Interpreter to fingerprint
+        refresh: Force a new probe, e.g. after installing packages
+    Returns:
+        Fingerprint with versions, installed distributions and disk/memory headroom
+    """
+    key = _interpreter_key(python)
+    with _lock:
+        if not refresh and key in _cache:
+            return _cache[key]
+
+    started = time.perf_counter()
+    if key[0] == os.path.abspath(sys.executable):
+        fingerprint = _probe_current()
+    else:
+        fingerprint = _probe_foreign(python)
+
+    fingerprint.update({
+        "interpreter": key[0],
+        "interpreter_mtime": key[1],
+        "disk_free_bytes": shutil.disk_usage(fingerprint["prefix"]).free,
+        "memory_available_bytes": _memory_available_bytes(),
+        "probe_seconds": round(time.perf_counter() - started, 4),
+        "probed_at": time.time()
+    })
+
+    with _lock:
+        _cache[key] = fingerprint
+    return fingerprint
+
+
+def fingerprint_digest(fingerprint: Dict[str, Any]) -> str:
+    """
+    Stable digest of the parts of a fingerprint that can change program behaviour
+    Args:
+        fingerprint: Result of get_environment_fingerprint
+    Returns:
+        Hex digest of interpreter, Python version and installed distributions
+    """
+    payload = json.dumps([
+        fingerprint["interpreter"],
+        fingerprint["python_version"],
+        sorted(fingerprint["distributions"].items())
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def invalidate_environment_fingerprint(python: str = sys.executable):
+    """
+    Drop the cached fingerprint so the next check probes again
+    Args:
+        python: Interpreter whose fingerprint is stale
+    """
+    key = _interpreter_key(python)
+    with _lock:
+        _cache.pop(key, None)
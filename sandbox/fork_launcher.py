@@ -0,0 +1,151 @@
+"""
+Forkserver Launcher - Next Generation
+Main program of the forkserver process: preloads modules, then forks one child per run request.
+It is started as a script and imports nothing from the project, so forked runs never see the
+orchestrator's modules.
+"""
+import sys
+
+# Interpreter path without this script's directory (sandbox/)
+_BASE_PATH = list(sys.path[1:])
+
+import atexit
+import importlib
+import json
+import os
+import resource
+import runpy
+import select
+import signal
+import socket
+import traceback
+
+
+def _write_rusage(stats_path: str):
+    """Dump the child's own rusage (including reaped descendants) for the parent"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    stats = {
+        "cpu_user_time": own.ru_utime + children.ru_utime,
+        "cpu_system_time": own.ru_stime + children.ru_stime,
+        "peak_rss_bytes": max(own.ru_maxrss, children.ru_maxrss) * 1024,
+        "io_read_bytes": (own.ru_inblock + children.ru_inblock) * 512,
+        "io_write_bytes": (own.ru_oublock + children.ru_oublock) * 512
+    }
+    with open(stats_path, 'w', encoding='utf-8') as f:
+        json.dump(stats, f)
+
+
+def _run_child(request: dict, stdout_fd: int, stderr_fd: int, preloaded: set):
+    """
+    Body of a forked run; never returns
+    Args:
+        request: {"script_path", "cwd", "stats_path"}
+        stdout_fd: Write end of the parent's stdout pipe
+        stderr_fd: Write end of the parent's stderr pipe
+        preloaded: Modules the server had loaded after preloading; everything else is dropped
+    """
+    script_path, cwd = request["script_path"], request.get("cwd")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    for fd, target in ((devnull, 0), (stdout_fd, 1), (stderr_fd, 2)):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdout = open(1, 'w', encoding='utf-8', closefd=False, buffering=1)
+    sys.stderr = open(2, 'w', encoding='utf-8', closefd=False, buffering=1)
+
+    for name in list(sys.modules):
+        if name not in preloaded:
+            del sys.modules[name]
+    sys.argv = [script_path]
+    sys.path[:] = [os.path.dirname(os.path.abspath(script_path))] + ([cwd] if cwd else []) + _BASE_PATH
+    if cwd:
+        os.chdir(cwd)
+        os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [cwd, os.environ.get("PYTHONPATH")]))
+
+    code = 0
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        # Drop the launcher's own frames so the traceback looks like a plain interpreter run
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != script_path:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        code = 1
+    try:
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        _write_rusage(request["stats_path"])
+    finally:
+        os._exit(code)
+
+
+def _send(conn: socket.socket, message: dict):
+    conn.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+
+def _handle(conn: socket.socket, preloaded: set):
+    """Serve one run request: fork the run, report its pid, wait for it and report its exit code"""
+    message, fds, _, _ = socket.recv_fds(conn, 65536, 2)
+    request = json.loads(message)
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        os.setpgrp()
+        _run_child(request, fds[0], fds[1], preloaded)
+    # Also set it from this side, so the parent can kill the group as soon as it has the pid
+    try:
+        os.setpgid(pid, pid)
+    except OSError:
+        pass
+    for fd in fds:
+        os.close(fd)
+    _send(conn, {"pid": pid})
+    _, status = os.waitpid(pid, 0)
+    _send(conn, {"exitcode": os.waitstatus_to_exitcode(status)})
+
+
+def main():
+    """Preload, then serve run requests until the parent closes our stdin"""
+    socket_path, preload = sys.argv[1], json.loads(sys.argv[2])
+    sys.path[:] = _BASE_PATH
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+    preloaded = set(sys.modules)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(16)
+    # Request handlers are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    sys.stdout.write("ready\n")
+    sys.stdout.flush()
+
+    while True:
+        readable, _, _ = select.select([server, sys.stdin], [], [])
+        if sys.stdin in readable:
+            # The parent exited or stopped the server
+            return
+        conn, _ = server.accept()
+        if os.fork() == 0:
+            server.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            try:
+                _handle(conn, preloaded)
+            finally:
+                os._exit(0)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
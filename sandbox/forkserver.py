@@ -0,0 +1,213 @@
+"""
+Forkserver Runner - Next Generation
+Runs generated code in children forked from a pre-warmed interpreter
+"""
+import atexit
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+from rich.console import Console
+from sandbox.capture import BoundedCapture, capture_results
+from sandbox.monitor import ResourceMonitor
+
+console = Console()
+
+# Main program of the server process; run as a script so it starts without the orchestrator's modules
+LAUNCHER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fork_launcher.py")
+
+# Modules imported once by the forkserver so every forked run gets them for free
+DEFAULT_PRELOAD_MODULES = [
+    "json",
+    "re",
+    "math",
+    "random",
+    "collections",
+    "datetime",
+    "requests",
+    "pygame",
+]
+
+
+class ForkServerRunner:
+    """
+    Executes scripts in isolated children of a forkserver with common modules preloaded
+    """
+
+    def __init__(self, preload_modules: List[str] = None):
+        """
+        Initialize the runner
+        Args:
+            preload_modules: Modules to import in the forkserver, defaults to DEFAULT_PRELOAD_MODULES
+        """
+        self.preload_modules = preload_modules if preload_modules is not None else DEFAULT_PRELOAD_MODULES
+        self.server = None
+        self.socket_dir = None
+        self.socket_path = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_supported() -> bool:
+        """Check whether fork and descriptor passing over Unix sockets are available on this platform"""
+        return hasattr(os, "fork") and hasattr(socket, "AF_UNIX") and hasattr(socket, "send_fds")
+
+    def start(self):
+        """Start (or reuse) the forkserver and preload the common modules"""
+        with self._lock:
+            if self.server is not None and self.server.poll() is None:
+                return
+
+            self.socket_dir = tempfile.mkdtemp(prefix="forkserver_")
+            self.socket_path = os.path.join(self.socket_dir, "server.sock")
+            env = os.environ.copy()
+            # Keep pygame's banner out of the server's stdout
+            env.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+            # The server exits once its stdin reaches EOF, i.e. when this process stops it or dies
+            self.server = subprocess.Popen(
+                [sys.executable, LAUNCHER_PATH, self.socket_path, json.dumps(self.preload_modules)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env=env,
+                text=True
+            )
+            # Preloaded modules may print banners before the server reports in
+            line = self.server.stdout.readline()
+            while line and line.strip() != "ready":
+                line = self.server.stdout.readline()
+            if not line:
+                self.server.wait()
+                self.server = None
+                shutil.rmtree(self.socket_dir, ignore_errors=True)
+                raise RuntimeError("Forkserver failed to start")
+            atexit.register(self.stop)
+        console.print("[green]Forkserver 已启动并预加载常用模块[/green]")
+
+    def stop(self):
+        """Shut the forkserver down; runs already forked finish on their own"""
+        with self._lock:
+            if self.server is None:
+                return
+            try:
+                self.server.stdin.close()
+                self.server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.server.kill()
+                self.server.wait()
+            finally:
+                self.server.stdout.close()
+                self.server = None
+                shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+    def run(self, script_path: str, timeout: float = 30,
+            line_sink: Optional[Callable[[str, str], None]] = None, cwd: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run a script in a fresh forked child
+        Args:
+            script_path: Path of the script to run
+            timeout: Seconds before the child is killed
+            line_sink: Optional callback receiving (stream, line) while the child runs
+            cwd: Project root the child runs in
+        Returns:
+            Execution results with bounded stdout/stderr, return code and resource usage
+        """
+        stats_fd, stats_path = tempfile.mkstemp(suffix=".rusage")
+        os.close(stats_fd)
+        stdout_capture = BoundedCapture("stdout", line_sink=line_sink)
+        stderr_capture = BoundedCapture("stderr", line_sink=line_sink)
+        connection = replies = None
+
+        try:
+            self.start()
+            request = {
+                "script_path": os.path.abspath(script_path),
+                "cwd": os.path.abspath(cwd) if cwd else None,
+                "stats_path": stats_path
+            }
+            stdout_read, stdout_write = os.pipe()
+            stderr_read, stderr_write = os.pipe()
+            try:
+                connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                connection.connect(self.socket_path)
+                socket.send_fds(connection, [json.dumps(request).encode("utf-8")], [stdout_write, stderr_write])
+                replies = connection.makefile("r", encoding="utf-8")
+                pid = json.loads(replies.readline())["pid"]
+            except Exception:
+                os.close(stdout_read)
+                os.close(stderr_read)
+                raise
+            finally:
+                # The child holds its own copies; EOF arrives once it (and its children) exit
+                os.close(stdout_write)
+                os.close(stderr_write)
+
+            monitor = ResourceMonitor(pid).start()
+            pumps = [stdout_capture.start_pump(stdout_read), stderr_capture.start_pump(stderr_read)]
+            deadline = time.monotonic() + timeout
+
+            exitcode, timed_out = None, False
+            try:
+                connection.settimeout(max(deadline - time.monotonic(), 0.001))
+                exitcode = json.loads(replies.readline())["exitcode"]
+            except socket.timeout:
+                timed_out = True
+                self._kill(pid)
+            monitor.mark_finished()
+            for pump in pumps:
+                # Background grandchildren may keep the pipes open; don't wait on them forever
+                pump.join(timeout=1)
+
+            result = capture_results(stdout_capture, stderr_capture)
+            if timed_out:
+                result.update({
+                    "success": False,
+                    "stderr": result["stderr"] + "\nExecution timed out",
+                    "return_code": -1,
+                    "resources": monitor.stop()
+                })
+                return result
+
+            result.update({
+                "success": exitcode == 0,
+                "return_code": exitcode,
+                "resources": monitor.stop(self._read_rusage(stats_path))
+            })
+            return result
+        except Exception as e:
+            return {
+                "success": False,
+                "stdout": "",
+                "stderr": str(e),
+                "return_code": -1
+            }
+        finally:
+            for handle in (replies, connection):
+                if handle is not None:
+                    handle.close()
+            if os.path.exists(stats_path):
+                os.unlink(stats_path)
+
+    def _kill(self, pid: int):
+        """Kill the child together with its process group"""
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _read_rusage(self, path: str) -> Optional[Dict[str, Any]]:
+        """Read the rusage the child dumped on exit, if it got that far"""
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
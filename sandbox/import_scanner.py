@@ -0,0 +1,106 @@
+"""
+Import Scanner - Next Generation
+Finds the third-party modules a generated project needs before it is ever run
+"""
+import ast
+import importlib.util
+import json
+import subprocess
+import sys
+from pathlib import PurePosixPath
+from typing import Dict, List, Set
+
+# Modules available in every interpreter without installation
+BUILTIN_MODULES = set(sys.stdlib_module_names) | set(sys.builtin_module_names) | {"__future__"}
+
+
+def imports_in_source(source: str) -> Set[str]:
+    """
+    Collect absolute top-level imports of one Python source
+    Args:
+        source: Python source code
+    Returns:
+        Top-level module names; empty if the source does not parse
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return set()
+
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                modules.add(alias.name.split('.')[0])
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module.split('.')[0])
+    return modules
+
+
+def local_modules(code_files: List[Dict[str, str]]) -> Set[str]:
+    """
+    Names importable from the project itself
+    Args:
+        code_files: Coder output, a list of {"path", "content"} dicts
+    Returns:
+        Top-level module and package names defined by the project
+    """
+    names = set()
+    for file_info in code_files:
+        parts = PurePosixPath(file_info.get('path', '').replace('\\', '/')).parts
+        if not parts:
+            continue
+        names.add(parts[0] if len(parts) > 1 else PurePosixPath(parts[0]).stem)
+        # Files inside a source folder (e.g. src/game.py) are importable by their own name too
+        if len(parts) > 1:
+            names.add(PurePosixPath(parts[-1]).stem)
+    return names
+
+
+def scan_third_party_imports(code_files: List[Dict[str, str]]) -> Set[str]:
+    """
+    Compute the third-party modules imported anywhere in the project
+    Args:
+        code_files: Coder output, a list of {"path", "content"} dicts
+    Returns:
+        Top-level third-party module names
+    """
+    imported = set()
+    for file_info in code_files:
+        if file_info.get('path', '').endswith('.py'):
+            imported |= imports_in_source(file_info.get('content', ''))
+    return imported - BUILTIN_MODULES - local_modules(code_files)
+
+
+def find_unavailable_modules(modules: Set[str], python: str = sys.executable) -> List[str]:
+    """
+    Diff modules against what an interpreter can already import
+    Args:
+        modules: Top-level module names
+        python: Interpreter to check; the current one is checked in-process
+    Returns:
+        Sorted names that the interpreter cannot find
+    """
+    if not modules:
+        return []
+
+    if python == sys.executable:
+        # Packages may have been installed since the last lookup
+        importlib.invalidate_caches()
+        return sorted(name for name in modules if importlib.util.find_spec(name) is None)
+
+    # Another environment: probe every module in a single interpreter start
+    probe = (
+        "import importlib.util, json, sys\n"
+        "names = json.loads(sys.argv[1])\n"
+        "print(json.dumps([n for n in names if importlib.util.find_spec(n) is None]))\n"
+    )
+    result = subprocess.run(
+        [python, "-c", probe, json.dumps(sorted(modules))],
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    if result.returncode != 0:
+        return sorted(modules)
+    return sorted(json.loads(result.stdout))
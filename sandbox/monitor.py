@@ -0,0 +1,172 @@
+"""
+Resource Monitor - Next Generation
+Collects CPU, memory, I/O and process statistics for sandboxed runs (Linux /proc + rusage)
+"""
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def _read_proc_file(pid: int, name: str) -> Optional[str]:
+    """Read /proc/<pid>/<name>, returning None once the process is gone"""
+    try:
+        with open(f"/proc/{pid}/{name}", 'r') as f:
+            return f.read()
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+
+
+def _parse_stat(stat: str) -> Dict[str, int]:
+    """Parse the fields we need from /proc/<pid>/stat"""
+    # The command name may contain spaces, so split after its closing paren
+    fields = stat[stat.rindex(')') + 2:].split()
+    return {
+        "pgrp": int(fields[2]),
+        "utime": int(fields[11]),
+        "stime": int(fields[12]),
+        "rss_pages": int(fields[21])
+    }
+
+
+def _parse_io(io_text: str) -> Dict[str, int]:
+    """Parse /proc/<pid>/io into a dict"""
+    values = {}
+    for line in io_text.splitlines():
+        key, _, value = line.partition(':')
+        values[key.strip()] = int(value)
+    return values
+
+
+def rusage_to_dict(rusage) -> Dict[str, Any]:
+    """
+    Convert a resource.struct_rusage into the monitor's metric names
+    Args:
+        rusage: Value returned by os.wait4 or resource.getrusage
+    Returns:
+        Metric dictionary
+    """
+    return {
+        "cpu_user_time": rusage.ru_utime,
+        "cpu_system_time": rusage.ru_stime,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_bytes": rusage.ru_maxrss * 1024,
+        # Block counts are in 512-byte units
+        "io_read_bytes": rusage.ru_inblock * 512,
+        "io_write_bytes": rusage.ru_oublock * 512
+    }
+
+
+class ResourceMonitor:
+    """
+    Samples /proc for a process group while it runs and merges the samples with rusage
+    """
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        """
+        Initialize the monitor
+        Args:
+            pid: Process id of the run; it must lead its own process group
+            interval: Seconds between /proc samples
+        """
+        self.pid = pid
+        self.interval = interval
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.peak_rss_bytes = 0
+        self.seen_pids = set()
+        self.cpu_ticks = {}
+        self.io_bytes = {}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+
+    def start(self) -> "ResourceMonitor":
+        """Start sampling in a background thread"""
+        self._thread.start()
+        return self
+
+    def stop(self, rusage=None) -> Dict[str, Any]:
+        """
+        Stop sampling and return the collected metrics
+        Args:
+            rusage: Exact rusage of the run if the caller could obtain it
+        Returns:
+            Metric dictionary
+        """
+        if self.finished_at is None:
+            self.finished_at = time.monotonic()
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+        metrics = {
+            "wall_time": round(self.finished_at - self.started_at, 4),
+            "cpu_user_time": sum(ticks[0] for ticks in self.cpu_ticks.values()) / CLOCK_TICKS,
+            "cpu_system_time": sum(ticks[1] for ticks in self.cpu_ticks.values()) / CLOCK_TICKS,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "io_read_bytes": sum(io[0] for io in self.io_bytes.values()),
+            "io_write_bytes": sum(io[1] for io in self.io_bytes.values()),
+            "child_processes": max(len(self.seen_pids) - 1, 0),
+            "source": "proc"
+        }
+
+        if rusage is not None:
+            exact = rusage if isinstance(rusage, dict) else rusage_to_dict(rusage)
+            # rusage is exact for CPU, /proc can still see a larger group-wide RSS
+            for key, value in exact.items():
+                if key in ("cpu_user_time", "cpu_system_time"):
+                    metrics[key] = value
+                else:
+                    metrics[key] = max(metrics.get(key, 0), value)
+            metrics["source"] = "rusage+proc"
+
+        metrics["cpu_user_time"] = round(metrics["cpu_user_time"], 4)
+        metrics["cpu_system_time"] = round(metrics["cpu_system_time"], 4)
+        metrics["cpu_time"] = round(metrics["cpu_user_time"] + metrics["cpu_system_time"], 4)
+        return metrics
+
+    def mark_finished(self):
+        """Record the wall-clock end of the run without stopping the sampler yet"""
+        self.finished_at = time.monotonic()
+
+    def _sample_loop(self):
+        """Sample until stopped"""
+        while not self._stop_event.is_set():
+            self._sample()
+            self._stop_event.wait(self.interval)
+
+    def _group_pids(self) -> list:
+        """Find every live process in the run's process group"""
+        pids = []
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            stat = _read_proc_file(int(entry), "stat")
+            if stat and _parse_stat(stat)["pgrp"] == self.pid:
+                pids.append(int(entry))
+        if self.pid not in pids and os.path.exists(f"/proc/{self.pid}"):
+            # The run may not have moved into its own group yet
+            pids.append(self.pid)
+        return pids
+
+    def _sample(self):
+        """Take one sample of the process group"""
+        total_rss = 0
+        for pid in self._group_pids():
+            stat = _read_proc_file(pid, "stat")
+            if not stat:
+                continue
+            parsed = _parse_stat(stat)
+            self.seen_pids.add(pid)
+            self.cpu_ticks[pid] = (parsed["utime"], parsed["stime"])
+            total_rss += parsed["rss_pages"] * PAGE_SIZE
+
+            io_text = _read_proc_file(pid, "io")
+            if io_text:
+                io = _parse_io(io_text)
+                self.io_bytes[pid] = (io.get("read_bytes", 0), io.get("write_bytes", 0))
+
+        self.peak_rss_bytes = max(self.peak_rss_bytes, total_rss)
@@ -0,0 +1,144 @@
+"""
+Venv Cloning - Next Generation
+Creates per-workflow virtual environments as copy-on-write clones of a pre-provisioned base venv
+"""
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+from rich.console import Console
+from sandbox.content_store import place_file
+from sandbox.dependencies import Wheelhouse
+
+console = Console()
+
+DEFAULT_BASE_VENV = os.getenv(
+    "BASE_VENV_DIR",
+    str(Path.home() / ".cache" / "virtual_company" / "base_venv")
+)
+
+# Packages every sandbox starts with (see requirements.txt)
+DEFAULT_BASE_PACKAGES = ["requests", "pygame", "pytest"]
+
+BASE_MARKER = ".base_venv.json"
+
+
+class VenvCloner:
+    """
+    Keeps one base venv with common packages and clones it per workflow,
+    so a new sandbox costs directory entries rather than a venv build and package installs
+    """
+
+    def __init__(self, base_dir: str = DEFAULT_BASE_VENV, base_packages: List[str] = None):
+        """
+        Initialize the cloner
+        Args:
+            base_dir: Location of the base venv
+            base_packages: Packages installed into the base venv
+        """
+        self.base_dir = os.path.abspath(base_dir)
+        self.base_packages = base_packages if base_packages is not None else DEFAULT_BASE_PACKAGES
+
+    def ensure_base(self) -> str:
+        """
+        Build the base venv if it is missing or was built with a different package set
+        Returns:
+            Path of the base venv
+        """
+        os.makedirs(os.path.dirname(self.base_dir), exist_ok=True)
+        # Several workflows may start at once; only one of them builds the base
+        with open(self.base_dir + ".lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self._base_is_current():
+                return self.base_dir
+
+            console.print("[bold blue]正在构建基础虚拟环境...[/bold blue]")
+            subprocess.run([sys.executable, "-m", "venv", "--clear", self.base_dir], check=True)
+            result = Wheelhouse(python=self.python_path(self.base_dir)).install(self.base_packages)
+            if not result["success"]:
+                raise RuntimeError(f"基础虚拟环境安装依赖失败: {result['stderr'][-500:]}")
+
+            with open(os.path.join(self.base_dir, BASE_MARKER), 'w', encoding='utf-8') as f:
+                json.dump({"packages": sorted(self.base_packages), "python": sys.executable}, f)
+            console.print(f"[green]基础虚拟环境已就绪: {self.base_dir}[/green]")
+            return self.base_dir
+
+    def clone(self, target_dir: str) -> Dict[str, Any]:
+        """
+        Clone the base venv into target_dir
+        Args:
+            target_dir: Empty or missing directory for the new venv
+        Returns:
+            Clone report with the interpreter path and how files were placed
+        """
+        self.ensure_base()
+        started = time.perf_counter()
+        target_dir = os.path.abspath(target_dir)
+        old_prefix = self.base_dir.encode()
+        new_prefix = target_dir.encode()
+        methods = {"reflink": 0, "hardlink": 0, "copy": 0, "rewritten": 0, "symlink": 0}
+
+        for root, dirs, files in os.walk(self.base_dir):
+            relative_root = os.path.relpath(root, self.base_dir)
+            destination_root = os.path.normpath(os.path.join(target_dir, relative_root))
+            os.makedirs(destination_root, exist_ok=True)
+
+            for name in dirs + files:
+                source = os.path.join(root, name)
+                destination = os.path.join(destination_root, name)
+                if os.path.islink(source):
+                    link = os.readlink(source)
+                    if link.startswith(self.base_dir):
+                        link = target_dir + link[len(self.base_dir):]
+                    os.symlink(link, destination)
+                    methods["symlink"] += 1
+                    if name in dirs:
+                        # Do not descend into symlinked directories (e.g. lib64 -> lib)
+                        dirs.remove(name)
+                    continue
+                if name in dirs or name == BASE_MARKER:
+                    continue
+
+                if relative_root == "bin" or name == "pyvenv.cfg":
+                    # Scripts and activation files embed the venv's absolute path
+                    with open(source, 'rb') as f:
+                        content = f.read()
+                    if old_prefix in content:
+                        with open(destination, 'wb') as f:
+                            f.write(content.replace(old_prefix, new_prefix))
+                        os.chmod(destination, os.stat(source).st_mode)
+                        methods["rewritten"] += 1
+                        continue
+
+                methods[place_file(source, destination)] += 1
+
+        seconds = round(time.perf_counter() - started, 3)
+        console.print(f"[green]虚拟环境克隆完成: {target_dir} ({seconds}s)[/green]")
+        return {
+            "path": target_dir,
+            "python": self.python_path(target_dir),
+            "methods": methods,
+            "seconds": seconds
+        }
+
+    @staticmethod
+    def python_path(venv_dir: str) -> str:
+        """Interpreter of a venv"""
+        return os.path.join(venv_dir, "bin", "python")
+
+    def _base_is_current(self) -> bool:
+        """Whether the base venv exists with the requested packages"""
+        marker = os.path.join(self.base_dir, BASE_MARKER)
+        if not os.path.exists(marker) or not os.path.exists(self.python_path(self.base_dir)):
+            return False
+        try:
+            with open(marker, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return info.get("packages") == sorted(self.base_packages) and info.get("python") == sys.executable
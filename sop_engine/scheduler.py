@@ -7,6 +7,7 @@ from typing import Dict, Any, Optional
 from dataclasses import dataclass
 import json
 import os
+import time
 from pathlib import Path
 
 from roles.architect import Architect
@@ -17,6 +18,8 @@ from roles.project_manager import ProjectManager
 from roles.auditor import Auditor
 from roles.sysadmin import SysAdmin
 from roles.evolution_officer import EvolutionOfficer
+from workspace.virtual import VirtualWorkspace
+from qa.static_review import StaticReviewGate, format_issues
 
 class CompanyStage(Enum):
     """Company workflow stages"""
@@ -24,6 +27,7 @@ class CompanyStage(Enum):
     PM_ANALYSIS = "pm_analysis"
     ARCHITECT_DESIGN = "architect_design"
     CODER_IMPLEMENTATION = "coder_implementation"
+    STATIC_REVIEW = "static_review"
     TECHLEAD_REVIEW = "techlead_review"
     RUNNER_EXECUTION = "runner_execution"
     SYSADMIN_ENVIRONMENT = "sysadmin_environment"
@@ -45,19 +49,37 @@ class WorkflowState:
     acceptance_result: Dict[str, Any] = None
     error_message: str = ""
     artifacts: Dict[str, Any] = None
+    stage_timings: Dict[str, float] = None
 
 class SOPScheduler:
     """SOP State Graph Scheduler - manages the workflow between different roles"""
     
-    def __init__(self):
+    def __init__(self, isolate_environment: bool = False, qa_fail_fast: bool = False, output_dir: str = ".",
+                 static_review_retries: int = 2):
+        """
+        Initialize the scheduler
+        Args:
+            isolate_environment: Run each workflow in its own clone of the base venv
+            qa_fail_fast: End the QA stage at the first failing test
+            output_dir: Directory the accepted project is written to
+            static_review_retries: Times code failing the static pre-review goes straight back to the Coder
+        """
+        self.isolate_environment = isolate_environment
+        self.qa_fail_fast = qa_fail_fast
+        self.output_dir = output_dir
+        self.static_review_retries = static_review_retries
+        self.static_review = StaticReviewGate()
+        # Generated files live in memory until the project is accepted
+        self.workspace = VirtualWorkspace("workflow")
         self.project_manager = ProjectManager()
         self.architect = Architect()
-        self.coder = Coder()
-        self.techlead = TechLead()
-        self.qa_engineer = QAEngineer()
-        self.runner = SysAdmin()  # Using SysAdmin for both running and environment management
+        self.coder = Coder(workspace=self.workspace)
+        self.techlead = TechLead(workspace=self.workspace)
+        self.qa_engineer = QAEngineer(workspace=self.workspace)
+        # Using SysAdmin for both running and environment management
+        self.runner = SysAdmin(execution_mode="subprocess", output_sink=self._log_run_output,
+                               workspace=self.workspace)
         self.auditor = Auditor()
-        self.sysadmin = SysAdmin()
         self.evolution_officer = EvolutionOfficer()
         
         # Initialize workflow state
@@ -69,6 +91,7 @@ class SOPScheduler:
             CompanyStage.PM_ANALYSIS: self._process_pm_analysis,
             CompanyStage.ARCHITECT_DESIGN: self._process_architect_design,
             CompanyStage.CODER_IMPLEMENTATION: self._process_coder_implementation,
+            CompanyStage.STATIC_REVIEW: self._process_static_review,
             CompanyStage.TECHLEAD_REVIEW: self._process_techlead_review,
             CompanyStage.RUNNER_EXECUTION: self._process_runner_execution,
             CompanyStage.SYSADMIN_ENVIRONMENT: self._process_sysadmin_environment,
@@ -86,6 +109,7 @@ class SOPScheduler:
             CompanyStage.PM_ANALYSIS,
             CompanyStage.ARCHITECT_DESIGN,
             CompanyStage.CODER_IMPLEMENTATION,
+            CompanyStage.STATIC_REVIEW,
             CompanyStage.TECHLEAD_REVIEW,
             CompanyStage.RUNNER_EXECUTION,
             CompanyStage.SYSADMIN_ENVIRONMENT,
@@ -106,6 +130,21 @@ class SOPScheduler:
                 self._trigger_evolution_analysis()
                 return self.state
             
+            # Hard static failures go straight back to the Coder, without an LLM review round-trip
+            if stage == CompanyStage.STATIC_REVIEW:
+                retries = 0
+                while not self.state.artifacts['static_review']['passed'] and retries < self.static_review_retries:
+                    retries += 1
+                    console.print("[bold yellow]静态预审未通过，返回编码阶段...[/bold yellow]")
+                    for retry_stage in (CompanyStage.CODER_IMPLEMENTATION, CompanyStage.STATIC_REVIEW):
+                        self.state.stage = retry_stage
+                        success = self._execute_stage(retry_stage)
+                        if not success:
+                            self.state.stage = CompanyStage.FAILED
+                            # Trigger evolution officer to analyze failure
+                            self._trigger_evolution_analysis()
+                            return self.state
+            
             # Check if we need to loop back due to review rejection
             if stage == CompanyStage.TECHLEAD_REVIEW:
                 review_approved = self.state.artifacts.get('review_approved', True)
@@ -148,8 +187,15 @@ class SOPScheduler:
             project_context=self.state.user_requirement
         )
     
+    def _log_run_output(self, stream: str, line: str):
+        """Forward live output of the code being run to the console"""
+        style = "red" if stream == "stderr" else "dim"
+        # The program's output is data, not markup: "[/]" or "[bold]" in it must print verbatim
+        console.print(f"[{style}]  │ {escape(line)}[/{style}]", markup=True, highlight=False)
+    
     def _execute_stage(self, stage: CompanyStage) -> bool:
         """Execute a single stage"""
+        started = time.perf_counter()
         try:
             handler = self.workflow_graph.get(stage)
             if handler:
@@ -161,6 +207,12 @@ class SOPScheduler:
             console.print(f"[bold red]执行阶段 {stage} 时出错: {e}[/bold red]")
             self.state.error_message = str(e)
             return False
+        finally:
+            # Seconds per stage, summed over repeated executions
+            if self.state.stage_timings is None:
+                self.state.stage_timings = {}
+            self.state.stage_timings[stage.value] = round(
+                self.state.stage_timings.get(stage.value, 0.0) + time.perf_counter() - started, 4)
     
     def _process_pm_requirements(self) -> bool:
         """Process PM requirements stage"""
@@ -221,7 +273,8 @@ class SOPScheduler:
         
         result = self.coder.implement_code(
             design_document=self.state.design_document,
-            task_description=task_description
+            task_description=task_description,
+            design=(self.state.artifacts or {}).get('design_document', {})
         )
         
         if result['success']:
@@ -230,6 +283,7 @@ class SOPScheduler:
                 self.state.artifacts = {}
             self.state.artifacts.update({
                 'implementation': result['code_files'],
+                'entry_point': result.get('entry_point', ''),
                 'files_created': result['files_created']
             })
             console.print("[green]代码实现完成[/green]")
@@ -238,6 +292,24 @@ class SOPScheduler:
             console.print(f"[red]代码实现失败: {result.get('error', 'Unknown error')}[/red]")
             return False
     
+    def _process_static_review(self) -> bool:
+        """Process static pre-review stage - local checks before the LLM review"""
+        if not self.state.artifacts:
+            self.state.artifacts = {}
+        result = self.static_review.review(
+            self.workspace.files("code"),
+            self.state.artifacts.get('design_document', {})
+        )
+        self.state.artifacts['static_review'] = result
+        
+        if result['passed']:
+            console.print(f"[green]静态预审通过 ({result['files']} 个文件, {result['seconds']}s)[/green]")
+        else:
+            # Feedback for the Coder's next iteration
+            self.state.review_feedback = f"静态检查发现以下问题:\n{format_issues(result['errors'])}"
+            console.print(f"[yellow]静态预审发现 {len(result['errors'])} 个问题 ({result['seconds']}s)[/yellow]")
+        return True
+    
     def _process_techlead_review(self) -> bool:
         """Process techlead review stage"""
         # Get implementation details
@@ -245,8 +317,9 @@ class SOPScheduler:
         design_document = self.state.design_document
         
         # Perform code review
+        # With generated files in the workspace the TechLead reviews those instead of the raw output
         review_result = self.techlead.review_code(
-            code=implementation,
+            code="" if self.workspace.paths("code") else implementation,
             design_document=design_document,
             task_description=self.state.user_requirement
         )
@@ -277,14 +350,29 @@ class SOPScheduler:
         """Process runner execution stage"""
         console.print("[bold yellow]执行阶段: 代码运行[/bold yellow]")
         
-        # Run the implementation code in a sandbox environment
-        run_result = self.runner.run_code_with_monitoring(
-            code_content=self.state.implementation,
-            environment_requirements="Standard Python environment"
-        )
-        
         if not self.state.artifacts:
             self.state.artifacts = {}
+        
+        if self.isolate_environment and 'sandbox_env' not in self.state.artifacts:
+            self.state.artifacts['sandbox_env'] = self.runner.create_sandbox_env("workflow", activate=True)
+        
+        # Provision third-party dependencies up front instead of crash-install-rerun cycles
+        provisioning = self.runner.provision_dependencies(self.workspace.files("code"))
+        self.state.artifacts['dependency_provisioning'] = provisioning
+        if not provisioning['success']:
+            console.print(f"[yellow]依赖预安装失败: {', '.join(provisioning['missing_modules'])}[/yellow]")
+        
+        # Run the generated project in its own sandbox directory; fall back to the raw output
+        if self.workspace.paths("code"):
+            run_result = self.runner.run_project_with_monitoring(
+                entry_point=self.state.artifacts.get('entry_point', '')
+            )
+        else:
+            run_result = self.runner.run_code_with_monitoring(
+                code_content=self.state.implementation,
+                environment_requirements="Standard Python environment"
+            )
+        
         self.state.artifacts.update({
             'run_result': run_result
         })
@@ -300,8 +388,9 @@ class SOPScheduler:
         """Process sysadmin environment stage"""
         console.print("[bold yellow]执行阶段: 环境管理[/bold yellow]")
         
-        # Check environment health and ensure everything is properly configured
-        health_result = self.sysadmin.check_environment()
+        # Check environment health and ensure everything is properly configured, in the interpreter
+        # the generated code runs with (the workflow's sandbox venv when the environment is isolated)
+        health_result = self.runner.check_environment()
         
         if not self.state.artifacts:
             self.state.artifacts = {}
@@ -326,10 +415,15 @@ class SOPScheduler:
         )
         
         if test_result['success']:
-            # Execute tests against the implementation
+            # Tests import pytest and whatever the code under test needs
+            self.runner.provision_dependencies()
+            
+            # Execute the workspace's tests against its code
             test_execution = self.qa_engineer.execute_tests(
                 implementation_code=self.state.implementation,
-                test_cases=test_result['test_cases']
+                test_cases=test_result['test_cases'],
+                python=self.runner.python,
+                fail_fast=self.qa_fail_fast
             )
             
             self.state.test_results = test_execution
@@ -339,9 +433,13 @@ class SOPScheduler:
             self.state.artifacts.update({
                 'test_cases': test_result['test_cases'],
                 'test_strategy': test_result['test_strategy'],
-                'test_execution': test_execution
+                'test_execution': test_execution,
+                'coverage': test_execution.get('coverage', {})
             })
             
+            if test_execution.get('no_tests'):
+                console.print("[red]测试失败: 没有可执行的测试[/red]")
+                return False
             if test_execution['success'] and test_execution.get('failed', 0) == 0:
                 console.print("[green]测试通过[/green]")
                 return True
@@ -371,6 +469,10 @@ class SOPScheduler:
         
         if audit_result.get('status') == 'PASS':
             console.print("[green]项目验收通过[/green]")
+            manifest = self.workspace.flush(self.output_dir)
+            self.state.artifacts['workspace_manifest'] = manifest
+            console.print(f"[green]项目文件已写入 {manifest['root']}: 写入 {manifest['written']}, "
+                          f"未变化 {manifest['unchanged']}[/green]")
             return True
         else:
             console.print(f"[red]项目验收失败: {audit_result.get('feedback', 'Unknown error')}[/red]")
@@ -386,4 +488,5 @@ class SOPScheduler:
 
 # Import console here to avoid circular import
 from rich.console import Console
+from rich.markup import escape
 console = Console()
\ No newline at end of file
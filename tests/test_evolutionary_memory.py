@@ -0,0 +1,61 @@
+"""
+Evolutionary Memory Tests - Next Generation
+Near-duplicate merging must not fold distinct insights into each other
+"""
+from memory.evolutionary_memory import EvolutionaryMemory
+
+
+def _memory(tmp_path) -> EvolutionaryMemory:
+    return EvolutionaryMemory(str(tmp_path / "knowledge_base.json"), write_behind=False, compaction_interval=None)
+
+
+def _add_missing_modules(memory: EvolutionaryMemory, modules):
+    for module in modules:
+        memory.add_error_solution_pair(f"ModuleNotFoundError: No module named '{module}'", f"pip install {module}")
+
+
+def test_missing_modules_stay_distinct(tmp_path):
+    memory = _memory(tmp_path)
+    _add_missing_modules(memory, ["requests", "numpy", "pygame", "scipy"])
+
+    pairs = memory.knowledge_base["error_solution_pairs"]
+    assert [p["solution"] for p in pairs] == [
+        "pip install requests", "pip install numpy", "pip install pygame", "pip install scipy"]
+    assert all(p["hits"] == 1 for p in pairs)
+    assert memory.compact_duplicates() == 0
+    assert memory.apply_solutions("ModuleNotFoundError: No module named 'scipy'")[0] == "pip install scipy"
+
+
+def test_repeated_insight_is_merged(tmp_path):
+    memory = _memory(tmp_path)
+    _add_missing_modules(memory, ["requests", "numpy", "requests"])
+    memory.add_error_solution_pair(
+        "Traceback (most recent call last):\n  File \"/tmp/tmpa1b2c3d4/main.py\", line 3, in <module>\n"
+        "ModuleNotFoundError: No module named 'numpy'", "pip  install numpy")
+
+    pairs = memory.knowledge_base["error_solution_pairs"]
+    assert [(p["solution"], p["hits"]) for p in pairs] == [("pip install requests", 2), ("pip install numpy", 2)]
+
+
+def test_reopens_non_empty_knowledge_base(tmp_path):
+    _add_missing_modules(_memory(tmp_path), ["requests", "numpy"])
+
+    memory = _memory(tmp_path)
+    assert len(memory.knowledge_base["error_solution_pairs"]) == 2
+    assert memory.search_similar("No module named 'numpy'")[0]["solution"] == "pip install numpy"
+
+
+def test_ids_are_not_reused_after_compaction(tmp_path):
+    first, second = _memory(tmp_path), _memory(tmp_path)
+    first.add_error_solution_pair("ValueError: bad value 'x'", "validate x")
+    # Added concurrently, so only compaction can merge it
+    second.auto_refresh = False
+    second.add_error_solution_pair("ValueError: bad value 'x' ", "validate x")
+    first.add_error_solution_pair("KeyError: 'y'", "check y")
+    assert first.compact_duplicates() == 1
+    assert [p["id"] for p in first.knowledge_base["error_solution_pairs"]] == [0, 2]
+
+    first.add_error_solution_pair("KeyError: 'z'", "check z")
+    reopened = _memory(tmp_path)
+    reopened.add_error_solution_pair("KeyError: 'w'", "check w")
+    assert [p["id"] for p in reopened.knowledge_base["error_solution_pairs"]] == [0, 2, 3, 4]
@@ -0,0 +1,10 @@
+"""
+Workspace Package for Virtual Software Company - Next Generation
+"""
+from .virtual import VirtualWorkspace
+from .writer import WorkspaceWriter
+
+__all__ = [
+    'VirtualWorkspace',
+    'WorkspaceWriter'
+]
@@ -0,0 +1,166 @@
+"""
+Virtual Workspace - Next Generation
+Per-workflow in-memory file tree shared by the roles, flushed to disk only when needed
+"""
+import os
+import threading
+from typing import Dict, Any, List, Optional
+
+from sandbox.content_store import content_digest, normalize_project_path
+from workspace.writer import WorkspaceWriter
+
+
+class VirtualWorkspace:
+    """
+    Path -> content of one workflow's generated files, each tagged with a kind ("code" or "test")
+    """
+
+    def __init__(self, name: str = "workflow"):
+        """
+        Initialize an empty workspace
+        Args:
+            name: Label used in reports
+        """
+        self.name = name
+        self._files = {}
+        self._digests = {}
+        self._kinds = {}
+        self._lock = threading.RLock()
+        # Bumped on every change, so readers can tell whether anything moved
+        self.generation = 0
+        # Flush root -> {path: digest} written there by this workspace
+        self._flushed = {}
+
+    def write(self, path: str, content: str, kind: str = "code") -> str:
+        """
+        Add or replace a file
+        Args:
+            path: Project-relative path
+            content: File content
+            kind: "code" or "test"
+        Returns:
+            Content digest
+        Raises:
+            ValueError: If the path is unsafe
+        """
+        path = normalize_project_path(path)
+        digest = content_digest(content)
+        with self._lock:
+            if self._digests.get(path) != digest or self._kinds.get(path) != kind:
+                self._files[path] = content
+                self._digests[path] = digest
+                self._kinds[path] = kind
+                self.generation += 1
+        return digest
+
+    def write_files(self, files: List[Dict[str, str]], kind: str = "code", replace: bool = False) -> Dict[str, Any]:
+        """
+        Add a batch of files
+        Args:
+            files: List of {"path", "content"} dicts
+            kind: "code" or "test"
+            replace: Drop files of this kind that are not in the batch (a full regeneration)
+        Returns:
+            Diff against the workspace before the batch plus paths that were rejected as unsafe
+        """
+        with self._lock:
+            before = self.snapshot()
+            written, rejected = set(), []
+            for file_info in files:
+                try:
+                    self.write(file_info.get('path', ''), file_info.get('content', ''), kind)
+                    written.add(normalize_project_path(file_info.get('path', '')))
+                except ValueError:
+                    rejected.append(file_info.get('path', ''))
+            if replace:
+                for path in self.paths(kind):
+                    if path not in written:
+                        self.delete(path)
+            changes = self.diff(before)
+        changes["rejected"] = rejected
+        return changes
+
+    def read(self, path: str) -> str:
+        """
+        Content of a file
+        Raises:
+            KeyError: If the file does not exist
+        """
+        with self._lock:
+            return self._files[normalize_project_path(path)]
+
+    def delete(self, path: str):
+        """Remove a file if present"""
+        path = normalize_project_path(path)
+        with self._lock:
+            if path in self._files:
+                del self._files[path], self._digests[path], self._kinds[path]
+                self.generation += 1
+
+    def paths(self, kind: Optional[str] = None) -> List[str]:
+        """Sorted paths, optionally only those of one kind"""
+        with self._lock:
+            return sorted(p for p in self._files if kind is None or self._kinds[p] == kind)
+
+    def files(self, kind: Optional[str] = None) -> List[Dict[str, str]]:
+        """Files as the {"path", "content"} dicts the roles and the sandbox work with"""
+        with self._lock:
+            return [{"path": p, "content": self._files[p]} for p in self.paths(kind)]
+
+    def snapshot(self, kind: Optional[str] = None) -> Dict[str, str]:
+        """Path -> content digest"""
+        with self._lock:
+            return {p: self._digests[p] for p in self.paths(kind)}
+
+    def diff(self, since: Dict[str, str], kind: Optional[str] = None) -> Dict[str, List[str]]:
+        """
+        Compare the workspace with an earlier snapshot
+        Args:
+            since: Snapshot from snapshot()
+            kind: Only compare files of this kind
+        Returns:
+            {"added", "modified", "removed"} path lists
+        """
+        current = self.snapshot(kind)
+        return {
+            "added": sorted(p for p in current if p not in since),
+            "modified": sorted(p for p in current if p in since and since[p] != current[p]),
+            "removed": sorted(p for p in since if p not in current)
+        }
+
+    def render(self, kind: Optional[str] = None) -> str:
+        """All files of a kind as one text block, for prompts"""
+        return "\n\n".join(f"# File: {f['path']}\n{f['content']}" for f in self.files(kind))
+
+    def flush(self, root: str, writer: WorkspaceWriter = None) -> Dict[str, Any]:
+        """
+        Write the workspace to a directory, touching only files that changed since the last flush there
+        Args:
+            root: Target directory
+            writer: Writer to use, defaults to one rooted at root
+        Returns:
+            Writer manifest plus the files removed from disk
+        """
+        root = os.path.abspath(root)
+        writer = writer or WorkspaceWriter(root=root)
+        with self._lock:
+            flushed = self._flushed.get(root, {})
+            current = self.snapshot()
+            pending = [{"path": p, "content": self._files[p]} for p in current if flushed.get(p) != current[p]]
+
+        manifest = writer.write(pending)
+        removed = []
+        for path in sorted(set(flushed) - set(current)):
+            # Files this workspace wrote earlier and has since dropped
+            try:
+                os.unlink(os.path.join(root, path))
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+
+        failed = {entry["path"] for entry in manifest["files"] if entry["status"] == "error"}
+        with self._lock:
+            self._flushed[root] = {p: d for p, d in current.items() if p not in failed}
+        manifest["removed"] = removed
+        manifest["unchanged"] += len(current) - len(pending)
+        return manifest
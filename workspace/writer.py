@@ -0,0 +1,135 @@
+"""
+Workspace Writer - Next Generation
+Writes generated files atomically, in parallel, skipping files whose content is unchanged
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+from sandbox.content_store import content_digest, normalize_project_path
+
+
+def _default_file_mode() -> int:
+    """Mode a plain open() would create files with under the current umask"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+DEFAULT_FILE_MODE = _default_file_mode()
+
+
+class WorkspaceWriter:
+    """
+    Shared writer for Coder and QA output
+    """
+
+    def __init__(self, root: str = ".", max_workers: int = 8, parallel_threshold: int = 8):
+        """
+        Initialize the writer
+        Args:
+            root: Directory generated paths are relative to
+            max_workers: Threads used for large batches
+            parallel_threshold: Batches with at least this many files are written on the thread pool
+        """
+        self.root = root
+        self.max_workers = max_workers
+        self.parallel_threshold = parallel_threshold
+        # Absolute path -> (mtime_ns, size, digest) of files this writer has seen, to avoid rehashing
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def write(self, files: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Write a batch of files
+        Args:
+            files: List of {"path", "content"} dicts; a later entry for the same path wins
+        Returns:
+            Manifest with one {"path", "size", "sha256", "status"} entry per file
+            ("written", "unchanged" or "error") plus totals
+        """
+        started = time.perf_counter()
+        batch = {}
+        for file_info in files:
+            batch[file_info.get('path', '')] = file_info.get('content', '')
+
+        items = list(batch.items())
+        if len(items) >= self.parallel_threshold:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+                entries = list(pool.map(lambda item: self._write_one(*item), items))
+        else:
+            entries = [self._write_one(path, content) for path, content in items]
+
+        return {
+            "root": os.path.abspath(self.root),
+            "files": entries,
+            "written": sum(1 for e in entries if e["status"] == "written"),
+            "unchanged": sum(1 for e in entries if e["status"] == "unchanged"),
+            "errors": sum(1 for e in entries if e["status"] == "error"),
+            "bytes_written": sum(e["size"] for e in entries if e["status"] == "written"),
+            "seconds": round(time.perf_counter() - started, 4)
+        }
+
+    def _write_one(self, path: str, content: str) -> Dict[str, Any]:
+        """Write one file unless it already holds this content"""
+        data = content.encode('utf-8')
+        digest = content_digest(content)
+        entry = {"path": path, "size": len(data), "sha256": digest}
+        try:
+            destination = os.path.abspath(os.path.join(self.root, normalize_project_path(path)))
+        except ValueError as e:
+            return dict(entry, status="error", error=str(e))
+
+        if self._current_digest(destination, len(data)) == digest:
+            return dict(entry, status="unchanged")
+
+        directory = os.path.dirname(destination)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            mode = os.stat(destination).st_mode & 0o7777 if os.path.exists(destination) else DEFAULT_FILE_MODE
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.chmod(temp_path, mode)
+                # Readers see either the old or the new file, never a partial one
+                os.replace(temp_path, destination)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            stat = os.stat(destination)
+        except OSError as e:
+            return dict(entry, status="error", error=str(e))
+
+        with self._lock:
+            self._digests[destination] = (stat.st_mtime_ns, stat.st_size, digest)
+        return dict(entry, status="written")
+
+    def _current_digest(self, destination: str, size: int) -> str:
+        """Digest of the file on disk, or "" when it is missing or cannot match"""
+        try:
+            stat = os.stat(destination)
+        except OSError:
+            return ""
+        if stat.st_size != size:
+            return ""
+        with self._lock:
+            cached = self._digests.get(destination)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        try:
+            with open(destination, 'rb') as f:
+                existing = f.read()
+        except OSError:
+            return ""
+        # Same digest content_digest gives the UTF-8 encoded text
+        digest = hashlib.sha256(existing).hexdigest()
+        with self._lock:
+            self._digests[destination] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest